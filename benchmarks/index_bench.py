@@ -0,0 +1,175 @@
+"""
+FAISS index type benchmark (repo kökünden: python -m benchmarks.index_bench).
+
+Mevcut flat index'in (veya build_index --keep-checkpoints ile saklanan
+checkpoint'lerin) vektörlerinden her build yapılandırması (tip, HNSW M /
+efConstruction) için bir index kurar; arama parametreleri (efSearch, nprobe)
+aynı index üzerinde faiss.SearchParameters* ile taranır. Flat (exact)
+sonuçlara göre recall@k, sorgu gecikmesi ve bellek raporlanır.
+Sorgular: --query-file verilirse bge-m3 ile encode edilen gerçek sorgular,
+aksi halde corpus'tan ayrılan (index'e eklenmeyen) --queries adet vektör.
+
+    python -m benchmarks.index_bench --k 10 --json bench_index.json
+"""
+import os
+import glob
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+from scraper.build_index import FAISS_INDEX_PATH, EMBED_MODEL_NAME
+from tools.vector_index import (
+    new_index, index_memory_bytes, base_index, TRAIN_SIZE, HNSW_M, HNSW_EF_CONSTRUCTION,
+)
+
+# (index_type, build-time params, [search-time params, ...]): her satır bir kez kurulur
+DEFAULT_CONFIGS = [
+    ("flat", {}, [{}]),
+    ("sq8", {}, [{}]),
+    ("hnsw", {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION},
+     [{"ef_search": 16}, {"ef_search": 64}, {"ef_search": 128}]),
+    ("ivfpq", {}, [{"nprobe": 1}, {"nprobe": 8}, {"nprobe": 32}]),
+]
+
+
+def load_vectors(index_path: str = FAISS_INDEX_PATH, checkpoint_dir: str = None):
+    """(ids, vectors) from the embedding checkpoints or from a flat/hnsw index on disk."""
+    if checkpoint_dir:
+        ids, embs = [], []
+        for path in sorted(glob.glob(os.path.join(checkpoint_dir, "batch_*.npz"))):
+            data = np.load(path)
+            ids.append(data["ids"])
+            embs.append(data["emb"])
+        if not ids:
+            raise SystemExit(f"{checkpoint_dir} içinde checkpoint yok")
+        return np.concatenate(ids), np.vstack(embs).astype("float32")
+
+    index = faiss.read_index(index_path)
+    base = base_index(index)
+    if not isinstance(base, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+        raise SystemExit("Vektörler kayıpsız okunamıyor: flat/hnsw index veya --checkpoint-dir kullanın")
+    ids = faiss.vector_to_array(index.id_map) if hasattr(index, "id_map") else np.arange(index.ntotal)
+    return ids.astype("int64"), base.reconstruct_n(0, index.ntotal)
+
+
+def encode_queries(path: str):
+    from sentence_transformers import SentenceTransformer
+
+    with open(path, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    model = SentenceTransformer(EMBED_MODEL_NAME)
+    return model.encode(queries, convert_to_numpy=True, normalize_embeddings=True).astype("float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f != -1]) & set(t[t != -1])) for f, t in zip(found, truth))
+    return hits / max(1, sum(int((t != -1).sum()) for t in truth))
+
+
+def build_config(index_type: str, build: dict, ids, vectors, train_size: int):
+    """(index, build seconds) for one build configuration."""
+    t0 = time.perf_counter()
+    sample = vectors[:train_size]
+    index = new_index(vectors.shape[1], index_type, train_vectors=sample, hnsw_m=build.get("m", HNSW_M))
+    if "ef_construction" in build:
+        # efConstruction sadece add sırasında kullanılır
+        base_index(index).hnsw.efConstruction = build["ef_construction"]
+    index.add_with_ids(vectors, ids)
+    return index, time.perf_counter() - t0
+
+
+def search_params(index, params: dict):
+    """Per-call efSearch / nprobe (the index itself is not modified); None for exhaustive indexes."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW) and params.get("ef_search"):
+        return faiss.SearchParametersHNSW(efSearch=params["ef_search"])
+    if isinstance(base, faiss.IndexIVF) and params.get("nprobe"):
+        return faiss.SearchParametersIVF(nprobe=min(params["nprobe"], base.nlist))
+    return None
+
+
+def bench_search(index, params: dict, queries, truth, k: int) -> dict:
+    sp = search_params(index, params)
+
+    # Tek sorgu gecikmesi (retriever'ın istek başına yaptığı arama)
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for row, q in enumerate(queries):
+        s = time.perf_counter()
+        _, I = index.search(q[None, :], k, params=sp)
+        latencies.append(time.perf_counter() - s)
+        found[row] = I[0]
+
+    # Toplu arama throughput'u (micro-batch yolu)
+    s = time.perf_counter()
+    index.search(queries, k, params=sp)
+    batch_secs = time.perf_counter() - s
+
+    lat_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": round(recall_at_k(found, truth), 4),
+        "latency_ms_p50": round(float(np.percentile(lat_ms, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(lat_ms, 95)), 3),
+        "batch_qps": round(len(queries) / batch_secs, 1) if batch_secs else None,
+    }
+
+
+def bench_config(index_type: str, build: dict, sweep: list, ids, vectors, queries, truth, k: int, train_size: int):
+    """Build once, then one result per search-time params entry of `sweep`."""
+    index, build_secs = build_config(index_type, build, ids, vectors, train_size)
+    memory_mb = round(index_memory_bytes(index) / 2**20, 2)
+    results = []
+    for params in sweep:
+        results.append({
+            "index_type": index_type,
+            "params": {**build, **params},
+            **bench_search(index, params, queries, truth, k),
+            "memory_mb": memory_mb,
+            "build_secs": round(build_secs, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="flat / hnsw / ivfpq / sq8 recall-latency-memory karşılaştırması")
+    parser.add_argument("--index", default=FAISS_INDEX_PATH, help="vektörlerin okunacağı flat index")
+    parser.add_argument("--checkpoint-dir", default=None, help="build_index --keep-checkpoints çıktısı")
+    parser.add_argument("--query-file", default=None, help="satır başına bir sorgu")
+    parser.add_argument("--queries", type=int, default=500, help="corpus'tan ayrılacak sorgu vektörü sayısı")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE)
+    parser.add_argument("--json", default=None, help="sonuçları bu dosyaya yaz")
+    args = parser.parse_args()
+
+    ids, vectors = load_vectors(args.index, args.checkpoint_dir)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    ids, vectors = ids[order], vectors[order]
+    if args.query_file:
+        queries = encode_queries(args.query_file)
+    else:
+        queries, ids, vectors = vectors[:args.queries], ids[args.queries:], vectors[args.queries:]
+    print(f"{len(vectors)} vektör, {len(queries)} sorgu, dim={vectors.shape[1]}, k={args.k}")
+
+    exact = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    exact.add_with_ids(vectors, ids)
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for index_type, build, sweep in DEFAULT_CONFIGS:
+        for r in bench_config(index_type, build, sweep, ids, vectors, queries, truth, args.k, args.train_size):
+            results.append(r)
+            label = index_type + "".join(f" {k}={v}" for k, v in r["params"].items())
+            print(f"{label:<44} recall@{args.k}={r['recall_at_k']:.4f}  p50={r['latency_ms_p50']:.3f}ms  "
+                  f"p95={r['latency_ms_p95']:.3f}ms  qps(batch)={r['batch_qps']}  mem={r['memory_mb']}MB  "
+                  f"build={r['build_secs']}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n_vectors": len(vectors), "n_queries": len(queries), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+End-to-end pipeline latency benchmark (repo kökünden: python -m benchmarks.pipeline_bench).
+
+Replays the recorded query set through the compiled LangGraph app (app.ainvoke)
+with Gemini and Cohere replaced by deterministic stand-ins (benchmarks/stand_ins.py)
+that sleep for a configurable latency. Retrieval (bge-m3 encode, FAISS, BM25,
+context packing) runs for real, so it needs the built index under data/.
+
+Reports per-node and per-stage (LLM / encode / FAISS / BM25 / rerank, from
+state["metrics"]) p50/p95/p99, end-to-end latency and throughput for each
+client concurrency level, startup time and peak RSS as JSON:
+
+    python -m benchmarks.pipeline_bench --clients 1 8 32 --repeat 5 --llm-ms 400 --out bench.json
+
+Compare two commits by diffing their JSON outputs. The semantic cache and the
+LLM memo are off by default so every query exercises the full path.
+
+Startup is reported as: cold_import_secs (`import main_node` in a fresh
+interpreter, plus which heavy modules it pulled in), import_secs (in this
+process, after the stand-ins), warm_secs (import + warmup, i.e. everything
+lazy startup defers) and first_query_secs. --startup-mode lazy|eager compares
+the two STARTUP_MODEs.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+import numpy as np
+
+from benchmarks.stand_ins import FIXTURES_PATH, Latency, FakeChatModel, FakeCohereClient, install
+
+
+def summarize(seconds) -> dict:
+    ms = np.asarray(seconds, dtype="float64") * 1000
+    if not len(ms):
+        return {"count": 0}
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # Linux: KB, macOS: byte
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+HEAVY_MODULES = ("faiss", "torch", "sentence_transformers", "cohere", "langchain_google_genai")
+
+# Taze bir yorumlayıcıda main_node import süresi ve yüklenen ağır modüller
+COLD_IMPORT_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+import main_node
+secs = time.perf_counter() - started
+print(json.dumps({"secs": secs, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cold_import() -> dict:
+    """Wall time of `import main_node` in a new process (no API calls: dummy keys, tracing off)."""
+    env = {**os.environ, "LANGSMITH_TRACING": "false", "LANGCHAIN_TRACING_V2": "false"}
+    for key in ("GOOGLE_API_KEY", "COHERE_API_KEY"):
+        env.setdefault(key, "stand-in")
+    try:
+        out = subprocess.run([sys.executable, "-c", COLD_IMPORT_SCRIPT], cwd=REPO_ROOT, env=env, capture_output=True,
+                             text=True, timeout=600, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+    except Exception as e:
+        print(f"[UYARI] cold import ölçülemedi: {e}", file=sys.stderr)
+        return {"cold_import_secs": None, "cold_import_loaded": None}
+    return {"cold_import_secs": round(result["secs"], 3), "cold_import_loaded": result["loaded"]}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+async def run_clients(app, queries, clients: int, batching: bool):
+    """
+    `clients` concurrent callers drain the query list; returns
+    (wall secs, e2e secs, node timings, stage timings from state["metrics"]).
+    """
+    from tools.retriever import start_batching, stop_batching
+
+    if batching:
+        start_batching()
+    queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+    e2e, node_timings, stage_timings = [], {}, {}
+
+    async def client():
+        while not queue.empty():
+            query = queue.get_nowait()
+            started = time.perf_counter()
+            out = await app.ainvoke({"query": query})
+            e2e.append(time.perf_counter() - started)
+            for node_name, secs in out.get("timings", {}).items():
+                node_timings.setdefault(node_name, []).append(secs)
+            # Aynı stage birden çok node'da olabilir (ör. encode: cache_lookup + retrieval)
+            for breakdown in out.get("metrics", {}).values():
+                for stage, secs in breakdown.get("seconds", {}).items():
+                    stage_timings.setdefault(stage, []).append(secs)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client() for _ in range(clients)))
+    finally:
+        if batching:
+            await stop_batching()
+    return time.perf_counter() - started, e2e, node_timings, stage_timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmark of the RAG graph")
+    parser.add_argument("--recordings", default=FIXTURES_PATH, help="recorded queries + LLM responses")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="concurrency levels")
+    parser.add_argument("--repeat", type=int, default=3, help="query set replays per concurrency level")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="injected Gemini latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="per-token delay when streaming")
+    parser.add_argument("--rerank-ms", type=float, default=80.0, help="injected Cohere rerank latency")
+    parser.add_argument("--batching", action="store_true", help="enable encode/search + rerank micro-batching")
+    parser.add_argument("--semantic-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--memo", action="store_true", help="keep the LLM memo on")
+    parser.add_argument("--startup-mode", choices=("lazy", "eager"), default="lazy",
+                        help="STARTUP_MODE for the measured imports (see main_node)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON output path (default: stdout)")
+    args = parser.parse_args()
+
+    # Pipeline modülleri ayarlarını import anında okur
+    os.environ["SEMANTIC_CACHE"] = "1" if args.semantic_cache else "0"
+    os.environ["LLM_MEMO"] = "1" if args.memo else "0"
+    os.environ["STARTUP_MODE"] = args.startup_mode
+    startup = cold_import()
+
+    started = time.perf_counter()
+    recordings = install(
+        args.recordings,
+        llm_latency=Latency(args.llm_ms, args.llm_jitter_ms, args.token_ms, seed=args.seed),
+        rerank_latency=Latency(args.rerank_ms, args.llm_jitter_ms, seed=args.seed + 1),
+    )
+    from main_node import app, warmup
+    import_secs = time.perf_counter() - started
+    warmup()
+    startup_secs = time.perf_counter() - started
+    startup.update({"import_secs": round(import_secs, 3), "warm_secs": round(startup_secs, 3)})
+
+    # İlk sorgu: warmup'ın kapsamadığı ilk kullanım maliyetleri (structured output kurulumu vb.)
+    started = time.perf_counter()
+    asyncio.run(app.ainvoke({"query": recordings.queries[0]}))
+    startup["first_query_secs"] = round(time.perf_counter() - started, 3)
+
+    queries = recordings.queries * args.repeat
+    runs, all_nodes, all_stages, all_e2e = [], {}, {}, []
+    for clients in args.clients:
+        wall, e2e, node_timings, stage_timings = asyncio.run(run_clients(app, queries, clients, args.batching))
+        runs.append({
+            "clients": clients,
+            "queries": len(queries),
+            "wall_secs": round(wall, 3),
+            "throughput_qps": round(len(queries) / wall, 2) if wall else None,
+            "end_to_end": summarize(e2e),
+        })
+        all_e2e.extend(e2e)
+        for node_name, values in node_timings.items():
+            all_nodes.setdefault(node_name, []).extend(values)
+        for stage, values in stage_timings.items():
+            all_stages.setdefault(stage, []).extend(values)
+        print(f"[{clients:>3} client] {runs[-1]['throughput_qps']} q/s | "
+              f"p50 {runs[-1]['end_to_end']['p50_ms']}ms p95 {runs[-1]['end_to_end']['p95_ms']}ms",
+              file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "startup": startup,
+        "nodes": {name: summarize(values) for name, values in sorted(all_nodes.items())},
+        "stages": {name: summarize(values) for name, values in sorted(all_stages.items())},
+        "end_to_end": summarize(all_e2e),
+        "throughput": runs,
+        "calls": {"llm": FakeChatModel.calls, "rerank": FakeCohereClient.calls},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
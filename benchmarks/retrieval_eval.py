@@ -0,0 +1,179 @@
+"""
+Retrieval quality vs. speed evaluation (repo kökünden: python -m benchmarks.retrieval_eval).
+
+Labels: JSONL, one query per line, relevance given as chunk ids or as page URLs
+(a page label counts any chunk from that page; recall is then over pages):
+
+    {"query": "How do I add memory to a LangGraph agent?", "relevant_ids": [123, 456]}
+    {"query": "...", "relevant_sources": ["https://docs.langchain.com/.../persistence.md"]}
+
+Every combination of the variant axes is run over all labelled queries:
+    --mode       dense (semantic_search) | hybrid (hybrid_search_with_rerank)
+    --top-k      result count k
+    --optimize   off | on   (LLM query rewrite; off = raw query)
+    --rerank     off | on   (hybrid only)
+    --overfetch  SEARCH_OVERFETCH = RERANK_OVERFETCH factor (currently 2)
+    --index      name=path FAISS indexes to compare (build with --index-type)
+
+and recall@k, MRR, nDCG@k and per-query latency are reported as JSON:
+
+    python -m benchmarks.retrieval_eval --labels labels.jsonl --top-k 5 10 \\
+        --overfetch 1 2 --index flat=data/faiss_index.bin hnsw=data/faiss_hnsw.bin --out eval.json
+
+--stand-ins swaps Gemini/Cohere for the offline stand-ins (plumbing and latency
+only: stand-in rewrites and rerank scores say nothing about quality).
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import itertools
+import numpy as np
+
+
+def load_labels(path: str):
+    labels = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if item.get("relevant_ids"):
+                item["unit"], item["relevant"] = "id", {int(i) for i in item["relevant_ids"]}
+            else:
+                item["unit"], item["relevant"] = "source", set(item.get("relevant_sources", []))
+            labels.append(item)
+    return labels
+
+
+def score_query(results, label, k: int) -> dict:
+    """Binary-relevance recall@k, reciprocal rank and nDCG@k (each relevant unit counts once)."""
+    relevant = label["relevant"]
+    key = "global_chunk_id" if label["unit"] == "id" else "source"
+    found, dcg, rr = set(), 0.0, 0.0
+    for rank, r in enumerate(results[:k], 1):
+        unit = r.get(key)
+        if unit in relevant and unit not in found:
+            found.add(unit)
+            dcg += 1.0 / math.log2(rank + 1)
+            if not rr:
+                rr = 1.0 / rank
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return {
+        "recall": len(found) / len(relevant) if relevant else 0.0,
+        "mrr": rr,
+        "ndcg": dcg / ideal if ideal else 0.0,
+    }
+
+
+def run_variant(labels, variant: dict):
+    import tools.retriever as retriever_module
+
+    retriever_module.SEARCH_OVERFETCH = variant["overfetch"]
+    retriever_module.RERANK_OVERFETCH = variant["overfetch"]
+    k = variant["top_k"]
+
+    scores, latencies = [], []
+    for label in labels:
+        query = label["query"]
+        started = time.perf_counter()
+        if variant["mode"] == "dense":
+            search_query = retriever_module.optimize_query(query) if variant["optimize"] else query
+            results = retriever_module.semantic_search(search_query, top_k=k)
+        else:
+            results = retriever_module.hybrid_search_with_rerank.invoke({
+                "query": query,
+                "top_k": k,
+                "rerank": variant["rerank"],
+                # search_query verilince LLM rewrite atlanır
+                "search_query": "" if variant["optimize"] else query,
+            })
+        latencies.append(time.perf_counter() - started)
+        scores.append(score_query(results, label, k))
+
+    ms = np.asarray(latencies) * 1000
+    return {
+        **variant,
+        "recall_at_k": round(float(np.mean([s["recall"] for s in scores])), 4),
+        "mrr": round(float(np.mean([s["mrr"] for s in scores])), 4),
+        "ndcg_at_k": round(float(np.mean([s["ndcg"] for s in scores])), 4),
+        "latency_ms_mean": round(float(ms.mean()), 2),
+        "latency_ms_p50": round(float(np.percentile(ms, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(ms, 95)), 2),
+    }
+
+
+def variants(args):
+    for index_name, mode, top_k, optimize, rerank, overfetch in itertools.product(
+        [name for name, _ in args.index], args.mode, args.top_k, args.optimize, args.rerank, args.overfetch
+    ):
+        if mode == "dense" and rerank == "on":
+            continue  # semantic_search rerank yapmaz
+        yield {
+            "index": index_name,
+            "mode": mode,
+            "top_k": top_k,
+            "optimize": optimize == "on",
+            "rerank": rerank == "on",
+            "overfetch": overfetch,
+        }
+
+
+def parse_index(value: str):
+    name, sep, path = value.partition("=")
+    return (name, path) if sep else (os.path.splitext(os.path.basename(value))[0], value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recall@k / MRR / nDCG vs latency for retrieval variants")
+    parser.add_argument("--labels", required=True, help="JSONL: query + relevant_ids or relevant_sources")
+    parser.add_argument("--mode", nargs="+", choices=("dense", "hybrid"), default=["dense", "hybrid"])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10])
+    parser.add_argument("--optimize", nargs="+", choices=("off", "on"), default=["off", "on"])
+    parser.add_argument("--rerank", nargs="+", choices=("off", "on"), default=["off", "on"])
+    parser.add_argument("--overfetch", type=float, nargs="+", default=[2.0])
+    parser.add_argument("--index", type=parse_index, nargs="+", default=None,
+                        help="name=path FAISS index files (default: the configured index)")
+    parser.add_argument("--stand-ins", action="store_true", help="offline Gemini/Cohere stand-ins")
+    parser.add_argument("--out", default=None, help="JSON output path (default: stdout)")
+    args = parser.parse_args()
+
+    # Her varyant LLM'i gerçekten çağırsın (memo ilk varyanttan sonrakileri hızlı gösterirdi)
+    os.environ["LLM_MEMO"] = "0"
+    if args.stand_ins:
+        from benchmarks.stand_ins import install
+        install()
+
+    import tools.retriever as retriever_module
+
+    if args.index is None:
+        args.index = [("default", retriever_module.FAISS_INDEX_PATH)]
+    retrievers = {name: retriever_module.Retriever(index_path=path) for name, path in args.index}
+
+    labels = load_labels(args.labels)
+    results = []
+    for variant in variants(args):
+        # Tool ve semantic_search süreç singleton'ını kullanır: varyantın index'ine çevir
+        retriever = retrievers[variant["index"]]
+        retriever.warmup()
+        retriever_module._retriever = retriever
+        r = run_variant(labels, variant)
+        results.append(r)
+        print(f"{r['index']:<8} {r['mode']:<6} k={r['top_k']:<3} opt={'on ' if r['optimize'] else 'off'} "
+              f"rerank={'on ' if r['rerank'] else 'off'} x{r['overfetch']:<4} | recall={r['recall_at_k']:.3f} "
+              f"mrr={r['mrr']:.3f} ndcg={r['ndcg_at_k']:.3f} | p50={r['latency_ms_p50']}ms "
+              f"p95={r['latency_ms_p95']}ms", file=sys.stderr)
+
+    output = json.dumps({"labels": args.labels, "n_queries": len(labels), "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
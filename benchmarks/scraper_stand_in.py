@@ -0,0 +1,191 @@
+"""
+Local HTTP stand-in for docs.langchain.com, so the scraper can be checked offline
+(repo kökünden: python -m benchmarks.scraper_stand_in).
+
+DocsServer (http.server, 127.0.0.1, free port) serves:
+
+    /llms.txt         entry list pointing at the pages below
+    /docs/<name>.md   pages with ETag and/or Last-Modified; a matching
+                      If-None-Match / If-Modified-Since gets 304
+                      (If-None-Match wins when both are sent, as in RFC 9110)
+
+A page can be told to fail first (e.g. 429 with Retry-After: 0, then 503) and
+update() changes a page's body, ETag and Last-Modified. Every request is
+logged as (path, status, monotonic time) for the checks.
+
+check() runs scraper.download_markdowns against it twice and asserts that
+retries recover 429/5xx, that Last-Modified is stored only when the server
+sent it, that unchanged pages come back 304 while a changed one is
+downloaded again, and that request starts (retries included) respect the
+RateLimiter interval.
+"""
+import sys
+import time
+import hashlib
+import tempfile
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sahte sürüm tarihleri: update() saniye içinde çağrılsa bile Last-Modified değişsin
+BASE_MODIFIED = 1_700_000_000
+
+PAGES = {
+    "intro": {"body": "# Intro\n\nLangChain overview.", "etag": True, "last_modified": True},
+    "etag-only": {"body": "# ETag only\n\nNo Last-Modified header.", "etag": True, "last_modified": False},
+    "lm-only": {"body": "# Last-Modified only\n\nNo ETag header.", "etag": False, "last_modified": True},
+    "flaky": {"body": "# Flaky\n\nFails before it works.", "etag": True, "last_modified": True,
+              "fail": [429, 503]},
+}
+
+
+class _Page:
+    def __init__(self, body: str, etag: bool, last_modified: bool, fail=()):
+        self.use_etag = etag
+        self.use_last_modified = last_modified
+        self.fail = list(fail)
+        self.version = 0
+        self.set_body(body)
+
+    def set_body(self, body: str):
+        self.body = body.encode("utf-8")
+        self.version += 1
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()[:16]
+        self.last_modified = formatdate(BASE_MODIFIED + self.version * 86400, usegmt=True)
+
+    def not_modified(self, headers) -> bool:
+        if_none_match = headers.get("If-None-Match")
+        if if_none_match is not None and self.use_etag:
+            return if_none_match == self.etag
+        if_modified_since = headers.get("If-Modified-Since")
+        return self.use_last_modified and if_modified_since == self.last_modified
+
+
+class DocsServer:
+    """llms.txt + markdown pages on a background ThreadingHTTPServer (context manager)."""
+
+    def __init__(self, pages: dict = None):
+        self.pages = {name: _Page(**spec) for name, spec in (pages or PAGES).items()}
+        self.log = []  # (path, status, monotonic)
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def update(self, name: str, body: str):
+        with self._lock:
+            self.pages[name].set_body(body)
+
+    def statuses(self, path: str):
+        with self._lock:
+            return [status for p, status, _ in self.log if p == path]
+
+    def clear_log(self):
+        with self._lock:
+            self.log.clear()
+
+    def _send(self, handler, status: int, body: bytes = b"", headers: dict = None):
+        with self._lock:
+            self.log.append((handler.path, status, time.monotonic()))
+        handler.send_response(status)
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if body:
+            handler.wfile.write(body)
+
+    def _handle(self, handler):
+        path = handler.path
+        if path == "/llms.txt":
+            lines = ["# Docs", ""] + [f"- [{name}]({self.url(f'/docs/{name}.md')}): {name} page"
+                                      for name in self.pages]
+            return self._send(handler, 200, "\n".join(lines).encode("utf-8"), {"Content-Type": "text/plain"})
+
+        name = path[len("/docs/"):-len(".md")] if path.startswith("/docs/") and path.endswith(".md") else None
+        with self._lock:
+            page = self.pages.get(name)
+            failure = page.fail.pop(0) if page is not None and page.fail else None
+        if page is None:
+            return self._send(handler, 404)
+        if failure is not None:
+            return self._send(handler, failure, headers={"Retry-After": "0"})
+
+        headers = {"Content-Type": "text/markdown; charset=utf-8"}
+        if page.use_etag:
+            headers["ETag"] = page.etag
+        if page.use_last_modified:
+            headers["Last-Modified"] = page.last_modified
+        if page.not_modified(handler.headers):
+            return self._send(handler, 304, headers=headers)
+        return self._send(handler, 200, page.body, headers)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+def check(rate: float = 20.0, concurrency: int = 4):
+    from scraper.scraper import download_markdowns, load_meta
+
+    n = len(PAGES)
+    with DocsServer() as server, tempfile.TemporaryDirectory() as out:
+        txt_url = server.url("/llms.txt")
+
+        # 1. İlk indirme: hepsi 200, flaky sayfa 429 + 503'ten sonra iner
+        stats = download_markdowns(txt_url, output_dir=out, concurrency=concurrency, rate=rate)
+        assert stats == {"ok": n, "not_modified": 0, "failed": 0}, stats
+        assert server.statuses("/docs/flaky.md") == [429, 503, 200], server.statuses("/docs/flaky.md")
+
+        # 2. RateLimiter: sayfa istekleri (tekrarlar dahil) en az 1/rate aralıkla başlar
+        starts = sorted(t for path, _, t in server.log if path != "/llms.txt")
+        gaps = [b - a for a, b in zip(starts, starts[1:])]
+        assert min(gaps) >= 0.8 / rate, f"min gap {min(gaps):.4f}s < {1 / rate:.4f}s"
+
+        # 3. Last-Modified sadece sunucu gönderdiyse saklanır
+        meta = load_meta({"url": server.url("/docs/etag-only.md")}, out)
+        assert meta["etag"] and meta["last_modified"] is None, meta
+        meta = load_meta({"url": server.url("/docs/lm-only.md")}, out)
+        assert meta["etag"] is None and meta["last_modified"], meta
+
+        # 4. Koşullu GET: değişmeyenler 304, değişen sayfa yeniden iner
+        server.clear_log()
+        server.update("lm-only", "# Last-Modified only\n\nChanged.")
+        stats = download_markdowns(txt_url, output_dir=out, concurrency=concurrency, rate=rate)
+        assert stats == {"ok": 1, "not_modified": n - 1, "failed": 0}, stats
+        assert server.statuses("/docs/lm-only.md") == [200]
+
+    print(f"[OK] scraper stand-in: retry, conditional GET, Last-Modified, rate limit ({rate}/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the scraper against a local HTTP stand-in")
+    parser.add_argument("--rate", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    try:
+        check(args.rate, args.concurrency)
+    except AssertionError as e:
+        sys.exit(f"[HATA] {e}")
+
+
+if __name__ == "__main__":
+    main()
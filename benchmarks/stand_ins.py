@@ -0,0 +1,230 @@
+"""
+Deterministic local stand-ins for Gemini (ChatGoogleGenerativeAI) and Cohere
+(Client / AsyncClient), so the pipeline can be benchmarked offline.
+
+Responses come from a recordings file (benchmarks/fixtures/queries.json):
+each record holds a query plus what every LLM stage answered for it. A prompt
+is matched to the record whose query it contains; unknown prompts get the
+file's defaults. Every call sleeps for the configured latency (plus seeded
+jitter), streaming sleeps per token, so timings behave like the real APIs
+without their variance.
+
+install() must run before the first LLM / rerank call: the pipeline builds
+its clients lazily (tools.llm.get_chat_model, get_reranker) from the patched
+library attributes. Running it before importing main_node is simplest.
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from types import SimpleNamespace
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "queries.json")
+
+# Prompt başındaki rol cümlesinden hangi aşama olduğunu çıkar
+PROMPT_KINDS = [
+    ("query optimization assistant", "optimize"),
+    ("coding assistant", "code"),
+    ("explains code", "explain"),
+    ("assistant for LangChain ecosystem questions", "answer"),
+]
+WORD_RE = re.compile(r"\w+")
+
+
+class Latency:
+    """Injected latency: base_ms ± jitter (seeded, thread-safe), optional per-token delay."""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0, token_ms: float = 0.0, seed: int = 0):
+        self.base = base_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.token = token_ms / 1000.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            return max(0.0, self.base + self._rng.uniform(-self.jitter, self.jitter))
+
+
+class Recordings:
+    def __init__(self, path: str = FIXTURES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.defaults = data["defaults"]
+        # Uzun sorgu önce: biri diğerinin alt dizisi olsa bile doğru kayıt eşleşir
+        self.records = sorted(data["queries"], key=lambda r: len(r["query"]), reverse=True)
+
+    @property
+    def queries(self):
+        return [r["query"] for r in self.records]
+
+    def lookup(self, prompt: str, field: str):
+        for record in self.records:
+            if record["query"] in prompt and field in record:
+                return record[field]
+        return self.defaults[field]
+
+
+def prompt_kind(prompt: str) -> str:
+    for marker, kind in PROMPT_KINDS:
+        if marker in prompt:
+            return kind
+    return "answer"
+
+
+def _usage(prompt: str, text: str) -> dict:
+    # kelime sayısı token yerine: metrics yolu gerçek usage_metadata gibi beslensin
+    input_tokens, output_tokens = len(prompt.split()), len(text.split())
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
+
+
+def _message(text: str, prompt: str = ""):
+    return SimpleNamespace(content=text, usage_metadata=_usage(prompt, text))
+
+
+def _chunks(text: str):
+    # kelime + ardındaki boşluk: birleşince metnin aynısı
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class FakeChatModel:
+    """ChatGoogleGenerativeAI stand-in: invoke/ainvoke/stream/astream/with_structured_output."""
+
+    recordings = None
+    latency = Latency()
+    calls = 0
+
+    def __init__(self, model: str = "", google_api_key: str = None, **kwargs):
+        self.model = model
+
+    def _text(self, prompt: str) -> str:
+        FakeChatModel.calls += 1
+        return self.recordings.lookup(prompt, prompt_kind(prompt))
+
+    def invoke(self, prompt, *args, **kwargs):
+        text = self._text(str(prompt))
+        time.sleep(self.latency.sample())
+        return _message(text, str(prompt))
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        text = self._text(str(prompt))
+        await asyncio.sleep(self.latency.sample())
+        return _message(text, str(prompt))
+
+    def stream(self, prompt, *args, **kwargs):
+        text = self._text(str(prompt))
+        time.sleep(self.latency.sample())
+        for piece in _chunks(text):
+            time.sleep(self.latency.token)
+            yield SimpleNamespace(content=piece, usage_metadata=None)
+        # Gemini gibi: usage son chunk'ta
+        yield SimpleNamespace(content="", usage_metadata=_usage(str(prompt), text))
+
+    async def astream(self, prompt, *args, **kwargs):
+        text = self._text(str(prompt))
+        await asyncio.sleep(self.latency.sample())
+        for piece in _chunks(text):
+            await asyncio.sleep(self.latency.token)
+            yield SimpleNamespace(content=piece, usage_metadata=None)
+        yield SimpleNamespace(content="", usage_metadata=_usage(str(prompt), text))
+
+    def with_structured_output(self, schema, include_raw: bool = False):
+        return FakeStructuredModel(schema, include_raw)
+
+
+class FakeStructuredModel:
+    """Structured output: planner schemas (pydantic) from "plan", TypedDicts (verifier) from "verdict"."""
+
+    def __init__(self, schema, include_raw: bool = False):
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _value(self, prompt: str):
+        FakeChatModel.calls += 1
+        if hasattr(self.schema, "model_fields"):
+            plan = FakeChatModel.recordings.lookup(prompt, "plan")
+            return self.schema(**{k: v for k, v in plan.items() if k in self.schema.model_fields})
+        return dict(FakeChatModel.recordings.lookup(prompt, "verdict"))
+
+    def _result(self, prompt: str, value):
+        if not self.include_raw:
+            return value
+        raw = _message(json.dumps(value if isinstance(value, dict) else value.model_dump()), prompt)
+        return {"raw": raw, "parsed": value, "parsing_error": None}
+
+    def invoke(self, prompt, *args, **kwargs):
+        value = self._value(str(prompt))
+        time.sleep(FakeChatModel.latency.sample())
+        return self._result(str(prompt), value)
+
+    async def ainvoke(self, prompt, *args, **kwargs):
+        value = self._value(str(prompt))
+        await asyncio.sleep(FakeChatModel.latency.sample())
+        return self._result(str(prompt), value)
+
+
+def overlap_scores(query: str, documents: list):
+    """Deterministic relevance: share of query words found in the document."""
+    q = set(WORD_RE.findall(query.lower()))
+    scores = []
+    for doc in documents:
+        d = set(WORD_RE.findall(doc.lower()))
+        scores.append(len(q & d) / len(q) if q else 0.0)
+    return scores
+
+
+def _rerank_response(query: str, documents: list, top_n: int):
+    scores = overlap_scores(query, documents)
+    order = sorted(range(len(documents)), key=lambda i: (-scores[i], i))[:top_n]
+    return SimpleNamespace(results=[SimpleNamespace(index=i, relevance_score=scores[i]) for i in order])
+
+
+class FakeCohereClient:
+    """cohere.Client stand-in (rerank only)."""
+
+    latency = Latency()
+    calls = 0
+
+    def __init__(self, api_key: str = None, **kwargs):
+        pass
+
+    def rerank(self, model: str = None, query: str = "", documents: list = (), top_n: int = None, **kwargs):
+        FakeCohereClient.calls += 1
+        time.sleep(self.latency.sample())
+        return _rerank_response(query, list(documents), top_n or len(documents))
+
+
+class FakeCohereAsyncClient(FakeCohereClient):
+    """cohere.AsyncClient stand-in."""
+
+    async def rerank(self, model: str = None, query: str = "", documents: list = (), top_n: int = None, **kwargs):
+        FakeCohereClient.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        return _rerank_response(query, list(documents), top_n or len(documents))
+
+
+def install(recordings_path: str = FIXTURES_PATH, llm_latency: Latency = None, rerank_latency: Latency = None):
+    """
+    Swap the real clients for the stand-ins (patches the library modules, so it
+    must run before the pipeline builds its clients) and return the recordings.
+    """
+    import cohere
+    import langchain_google_genai
+
+    FakeChatModel.recordings = Recordings(recordings_path)
+    FakeChatModel.latency = llm_latency or Latency()
+    FakeCohereClient.latency = rerank_latency or Latency()
+
+    langchain_google_genai.ChatGoogleGenerativeAI = FakeChatModel
+    cohere.Client = FakeCohereClient
+    cohere.AsyncClient = FakeCohereAsyncClient
+    for key in ("GOOGLE_API_KEY", "COHERE_API_KEY"):
+        os.environ.setdefault(key, "stand-in")
+    # LangSmith'e hiçbir şey gönderilmesin
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    return FakeChatModel.recordings
@@ -1,19 +1,54 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Literal
-from tools.planner import plan_query
-from tools.retriever import hybrid_search_with_rerank
-from tools.generate_agent import run_generate  # Generate core function
-from tools.explain_agent import run_explain    # Explain core function
-from tools.answer_agent import run_answer      # Answer core function
-from tools.verifier_agent import run_verifier
-from langsmith import Client
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
+from typing import TypedDict, List, Dict, Literal, Annotated
+from tools.planner import plan_query, aplan_query, infer_projects, PLANNER_MODEL
+from tools.retriever import (hybrid_search_with_rerank, ahybrid_search_with_rerank, get_retriever,
+                             get_reranker, OPTIMIZER_MODEL)
+from tools.generate_agent import run_generate, arun_generate, GENERATE_MODEL  # Generate core function
+from tools.explain_agent import run_explain, arun_explain, EXPLAIN_MODEL      # Explain core function
+from tools.answer_agent import run_answer, arun_answer, ANSWER_MODEL          # Answer core function
+from tools.verifier_agent import verify, averify, VERIFIER_MODEL
+from tools.llm import get_chat_model
+from tools.context_builder import build_context
+from tools.semantic_cache import get_semantic_cache, SEMANTIC_CACHE_ENABLED
+from tools.metrics import node_scope, record_node, compact
 import os
+import time
+import asyncio
+import argparse
+import functools
 import dotenv
 
 dotenv.load_dotenv()
-client = Client()
 
-print(f"✅ LangSmith tracing aktif! Proje: {os.getenv('LANGSMITH_PROJECT')}")
+if os.getenv("LANGSMITH_TRACING", "").lower() == "true":
+    print(f"✅ LangSmith tracing aktif! Proje: {os.getenv('LANGSMITH_PROJECT')}")
+
+# ===============================
+# Startup
+# ===============================
+# STARTUP_MODE=lazy (varsayılan): Gemini / Cohere client'ları, faiss, sentence-transformers
+# (torch) ve bge-m3 + index ilk kullanımda yüklenir → import hızlı (CLI araçları, worker
+# cold start). STARTUP_MODE=eager: hepsi import sırasında yüklenir, ilk istek beklemez.
+# RETRIEVER_WARMUP=1 sadece retriever'ı ısıtır. LangSmith tracing için LANGSMITH_* env
+# değişkenleri yeterli, client kurulmaz.
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+
+def warmup():
+    """Load everything lazy startup defers: retriever (model + index + docstore), chat models, reranker."""
+    get_retriever().warmup()
+    for model in {PLANNER_MODEL, OPTIMIZER_MODEL, ANSWER_MODEL, GENERATE_MODEL, EXPLAIN_MODEL, VERIFIER_MODEL}:
+        get_chat_model(model)
+    get_reranker()
+
+if STARTUP_MODE == "eager":
+    warmup()
+elif os.getenv("RETRIEVER_WARMUP", "0") == "1":
+    get_retriever().warmup()
+
+def merge_timings(left: Dict[str, float], right: Dict[str, float]) -> Dict[str, float]:
+    return {**(left or {}), **(right or {})}
 
 # ===============================
 # State (SADELEŞTİRİLMİŞ)
@@ -21,10 +56,13 @@ print(f"✅ LangSmith tracing aktif! Proje: {os.getenv('LANGSMITH_PROJECT')}")
 class PipelineState(TypedDict, total=False):
     # Zorunlu giriş
     query: str
+    stream: bool  # True → agent node'ları token'ları stream eder (bkz. stream_pipeline)
+    projects: List[str]  # opsiyonel: retrieval'ı bu dokümantasyon projeleriyle sınırla
 
     # Planner çıktıları
     tool: Literal["answer", "generate", "explain", "none"]
     path: Literal["fast", "slow"]
+    search_query: str  # PLANNER_MODE=combined iken planner'ın yazdığı arama sorgusu
 
     # Retrieval çıktıları
     context: str
@@ -35,23 +73,107 @@ class PipelineState(TypedDict, total=False):
     code: str
     confidence: float
 
-    # Verifier çıktısı
-    verdict: Literal["ok", "hallucination"]
+    # Verifier çıktısı (VERIFIER_POLICY'ye göre "pending"/"unverified" da olabilir)
+    verdict: Literal["ok", "hallucination", "pending", "unverified"]
+    verified_by: Literal["llm", "precheck", "none", "error"]
+    verification_id: str  # async politikada sonucu verdict_store'dan almak için
+
+    # Semantic cache
+    cache_hit: bool
+
+    # Node başına süre (saniye); paralel node'lar da yazabilsin diye birleştirilir
+    timings: Annotated[Dict[str, float], merge_timings]
+    # Node başına kırılım: LLM/encode/search/rerank süreleri, token'lar, cache sonuçları (tools.metrics)
+    metrics: Annotated[Dict[str, dict], merge_timings]
+
+# Cache'te saklanan / cache'ten dönen alanlar
+CACHED_FIELDS = ("tool", "path", "answer", "code", "citations", "verdict", "confidence", "verified_by")
+
+# ===============================
+# Semantic Cache Nodes
+# ===============================
+def _cacheable(state: PipelineState) -> bool:
+    # Kullanıcının seçtiği proje kapsamı cache anahtarında yok → kapsamlı sorgular cache'lenmez
+    return SEMANTIC_CACHE_ENABLED and not state.get("projects")
+
+def cache_lookup_node(state: PipelineState):
+    if not _cacheable(state):
+        return {"cache_hit": False}
+    cached = get_semantic_cache().lookup(state["query"])
+    if cached is None:
+        return {"cache_hit": False}
+    return {**cached, "cache_hit": True}
+
+async def acache_lookup_node(state: PipelineState):
+    if not _cacheable(state):
+        return {"cache_hit": False}
+    cached = await get_semantic_cache().alookup(state["query"])
+    if cached is None:
+        return {"cache_hit": False}
+    return {**cached, "cache_hit": True}
+
+def _cache_payload(state: PipelineState, **overrides):
+    return {**{k: state[k] for k in CACHED_FIELDS if k in state}, **overrides}
+
+def cache_store_node(state: PipelineState):
+    # Sadece doğrulanmış cevapları sakla ("pending" olanlar verifier bitince saklanır)
+    if _cacheable(state) and state.get("verdict") == "ok":
+        get_semantic_cache().store(state["query"], _cache_payload(state))
+    return {}
+
+async def acache_store_node(state: PipelineState):
+    if _cacheable(state) and state.get("verdict") == "ok":
+        await get_semantic_cache().astore(state["query"], _cache_payload(state))
+    return {}
 
 # ===============================
 # Planner Node
 # ===============================
+def _plan_update(decision: dict):
+    return {
+        "tool": decision["tool"],
+        "path": decision["path"],
+        "search_query": decision.get("search_query", ""),
+    }
+
 def planner_node(state: PipelineState):
-    decision = plan_query(state["query"])
-    return {"tool": decision["tool"], "path": decision["path"]}
+    return _plan_update(plan_query(state["query"]))
+
+async def aplanner_node(state: PipelineState):
+    return _plan_update(await aplan_query(state["query"]))
 
 # ===============================
 # Retrieval Node
 # ===============================
+def _projects(state: PipelineState) -> List[str]:
+    # Kullanıcı kapsamı yoksa sorgudan çıkarılan kapsam (PLANNER_PROJECT_SCOPE=1);
+    # regex tabanlı olduğu için speculative retrieval planner'ı beklemeden kullanabilir
+    return state.get("projects") or infer_projects(state["query"])
+
 def retrieval_node(state: PipelineState):
-    results = hybrid_search_with_rerank.invoke({"query": state["query"]})
-    context = "\n".join([r["content"] for r in results])
-    return {"context": context, "citations": results}
+    results = hybrid_search_with_rerank.invoke({
+        "query": state["query"],
+        "search_query": state.get("search_query", ""),
+        "projects": _projects(state),
+    })
+    context, citations = build_context(results)
+    return {"context": context, "citations": citations}
+
+async def aretrieval_node(state: PipelineState):
+    results = await ahybrid_search_with_rerank(
+        state["query"], search_query=state.get("search_query", ""), projects=_projects(state)
+    )
+    context, citations = build_context(results)
+    return {"context": context, "citations": citations}
+
+# ===============================
+# Token streaming (stream_mode="custom")
+# ===============================
+def token_writer(state: PipelineState, node_name: str):
+    if not state.get("stream"):
+        return None
+    writer = get_stream_writer()
+    return lambda text: writer({"node": node_name, "token": text})
 
 # ===============================
 # Doc QA Node
@@ -63,7 +185,7 @@ def answer_node(state: PipelineState):
         state.get("context", ""),
         state.get("citations", []),
         mode=mode,
-
+        on_token=token_writer(state, "answer"),
     )
     return {
         "answer": result["answer"],
@@ -71,6 +193,20 @@ def answer_node(state: PipelineState):
      
     }
 
+async def aanswer_node(state: PipelineState):
+    mode = "qa" if state["path"] == "fast" else "howto"
+    result = await arun_answer(
+        state["query"],
+        state.get("context", ""),
+        state.get("citations", []),
+        mode=mode,
+        on_token=token_writer(state, "answer"),
+    )
+    return {
+        "answer": result["answer"],
+        "citations": result["citations"],
+    }
+
 # ===============================
 # Generate Node
 # ===============================
@@ -79,7 +215,7 @@ def generate_node(state: PipelineState):
         state["query"],
         state.get("context", ""),
         state.get("citations", []),
-
+        on_token=token_writer(state, "generate"),
     )
     return {
         "code": result["code"],
@@ -87,12 +223,26 @@ def generate_node(state: PipelineState):
 
     }
 
+async def agenerate_node(state: PipelineState):
+    result = await arun_generate(
+        state["query"],
+        state.get("context", ""),
+        state.get("citations", []),
+        on_token=token_writer(state, "generate"),
+    )
+    return {
+        "code": result["code"],
+        "citations": result["citations"],
+    }
+
 # ===============================
 # Explain Node
 # ===============================
+# Kod parçası kullanıcının mesajında; retrieval zaten yapıldığı için context/citations aktarılır
 def explain_node(state: PipelineState):
     result = run_explain(
-        state["query"], state.get("context", ""), True
+        state["query"], state["query"], state.get("context", ""), state.get("citations", []),
+        on_token=token_writer(state, "explain"),
     )
     return {
         "answer": result["answer"],
@@ -100,43 +250,142 @@ def explain_node(state: PipelineState):
 
     }
 
+async def aexplain_node(state: PipelineState):
+    result = await arun_explain(
+        state["query"], state["query"], state.get("context", ""), state.get("citations", []),
+        on_token=token_writer(state, "explain"),
+    )
+    return {
+        "answer": result["answer"],
+        "citations": result["citations"],
+    }
+
 # ===============================
 # Verifier Node
 # ===============================
+def _store_when_verified(state: PipelineState):
+    """Arka planda doğrulanan cevabı verdict "ok" gelirse cache'e yaz."""
+    if not _cacheable(state):
+        return None
+
+    def on_done(result: dict):
+        if result.get("verdict") == "ok":
+            get_semantic_cache().store(
+                state["query"],
+                _cache_payload(state, verdict="ok", confidence=result.get("confidence")),
+            )
+    return on_done
+
+def _verifier_update(result: dict):
+    update = {
+        "verdict": result["verdict"],
+        "confidence": result["confidence"],
+        "verified_by": result.get("verified_by", "llm"),
+    }
+    if "verification_id" in result:
+        update["verification_id"] = result["verification_id"]
+    return update
+
 def verifier_node(state: PipelineState):
-    result = run_verifier(
+    result = verify(
         query=state["query"],
         answer=state.get("answer") or state.get("code", ""),
-        context=state.get("context", "")
+        context=state.get("context", ""),
+        on_done=_store_when_verified(state),
     )
-    return {
-        "verdict": result["verdict"],
-        "confidence": result["confidence"]
-    }
+    return _verifier_update(result)
+
+async def averifier_node(state: PipelineState):
+    result = await averify(
+        query=state["query"],
+        answer=state.get("answer") or state.get("code", ""),
+        context=state.get("context", ""),
+        on_done=_store_when_verified(state),
+    )
+    return _verifier_update(result)
 
 # ===============================
 # Fallback Node (domain dışı)
 # ===============================
 def fallback_node(state: PipelineState):
+    # Spekülatif modda gelmiş olabilecek retrieval sonucu atılır
     return {
         "answer": "Ben sadece LangChain, LangGraph ve LangSmith ekosistemi ile ilgili sorulara yanıt verebilirim.",
-
+        "context": "",
+        "citations": [],
     }
 
+# ===============================
+# Dispatch Node (spekülatif mod: planner + retrieval birleşme noktası)
+# ===============================
+def dispatch_node(state: PipelineState):
+    return {}
+
 # ===============================
 # Graph
 # ===============================
+# Her node hem sync hem async çalışır: app.invoke sync, app.ainvoke async fonksiyonları kullanır.
+# Süre state["timings"][<node adı>], node içindeki çağrıların kırılımı state["metrics"][<node adı>]
+# alanına yazılır; ikisi de rag_*_seconds metriklerine (GET /metrics) işlenir.
+def _instrumented(name, update, elapsed, breakdown):
+    record_node(name, elapsed)
+    update = {**update, "timings": {name: round(elapsed, 4)}}
+    breakdown = compact(breakdown)
+    if breakdown:
+        update["metrics"] = {name: breakdown}
+    return update
+
+def node(name, func, afunc=None):
+    @functools.wraps(func)
+    def timed(state):
+        with node_scope() as breakdown:
+            started = time.perf_counter()
+            update = func(state)
+            elapsed = time.perf_counter() - started
+        return _instrumented(name, update, elapsed, breakdown)
+
+    atimed = None
+    if afunc is not None:
+        @functools.wraps(afunc)
+        async def atimed(state):
+            with node_scope() as breakdown:
+                started = time.perf_counter()
+                update = await afunc(state)
+                elapsed = time.perf_counter() - started
+            return _instrumented(name, update, elapsed, breakdown)
+
+    return RunnableLambda(timed, afunc=atimed, name=func.__name__)
+
+# Spekülatif mod: retrieval planner ile aynı anda başlar (cevap/generate/explain hepsi aynı
+# retrieval'ı kullanıyor); planner tool="none" derse sonuç fallback'te atılır. Bu modda
+# retrieval planner'ın search_query'sini bekleyemez, optimize_query kullanır.
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+
 graph = StateGraph(PipelineState)
 
-graph.add_node("planner", planner_node)
-graph.add_node("retrieval", retrieval_node)
-graph.add_node("answer", answer_node)
-graph.add_node("generate", generate_node)
-graph.add_node("explain", explain_node)
-graph.add_node("fallback", fallback_node)
-graph.add_node("verifier", verifier_node)
+graph.add_node("cache_lookup", node("cache_lookup", cache_lookup_node, acache_lookup_node))
+graph.add_node("cache_store", node("cache_store", cache_store_node, acache_store_node))
+graph.add_node("planner", node("planner", planner_node, aplanner_node))
+graph.add_node("retrieval", node("retrieval", retrieval_node, aretrieval_node))
+graph.add_node("answer", node("answer", answer_node, aanswer_node))
+graph.add_node("generate", node("generate", generate_node, agenerate_node))
+graph.add_node("explain", node("explain", explain_node, aexplain_node))
+graph.add_node("fallback", node("fallback", fallback_node))
+graph.add_node("verifier", node("verifier", verifier_node, averifier_node))
+if SPECULATIVE_RETRIEVAL:
+    graph.add_node("dispatch", node("dispatch", dispatch_node))
 
-graph.set_entry_point("planner")
+graph.set_entry_point("cache_lookup")
+
+# Cache hit → doğrudan bitir, miss → planner (spekülatif modda planner + retrieval paralel)
+def route_after_cache(state: PipelineState):
+    if state.get("cache_hit"):
+        return END
+    return ["planner", "retrieval"] if SPECULATIVE_RETRIEVAL else "planner"
+
+graph.add_conditional_edges(
+    "cache_lookup", route_after_cache, ["planner", "retrieval", END]
+)
 
 # Planner sonrası routing
 def route_after_planner(state: PipelineState):
@@ -146,9 +395,10 @@ def route_after_planner(state: PipelineState):
         return "retrieval"
     return "fallback"
 
-graph.add_conditional_edges(
-    "planner", route_after_planner, ["retrieval", "fallback"]
-)
+if not SPECULATIVE_RETRIEVAL:
+    graph.add_conditional_edges(
+        "planner", route_after_planner, ["retrieval", "fallback"]
+    )
 
 # Retrieval sonrası routing
 def route_after_retrieval(state: PipelineState):
@@ -159,9 +409,21 @@ def route_after_retrieval(state: PipelineState):
     elif state["tool"] == "explain":
         return "explain"
 
-graph.add_conditional_edges(
-    "retrieval", route_after_retrieval, ["answer", "generate", "explain"]
-)
+# Spekülatif mod: planner ve retrieval bitince dispatch, tool'a göre agent veya fallback
+def route_after_dispatch(state: PipelineState):
+    if state.get("tool") in ["answer", "generate", "explain"]:
+        return route_after_retrieval(state)
+    return "fallback"
+
+if SPECULATIVE_RETRIEVAL:
+    graph.add_edge(["planner", "retrieval"], "dispatch")
+    graph.add_conditional_edges(
+        "dispatch", route_after_dispatch, ["answer", "generate", "explain", "fallback"]
+    )
+else:
+    graph.add_conditional_edges(
+        "retrieval", route_after_retrieval, ["answer", "generate", "explain"]
+    )
 
 # Her ana agent node -> verifier
 graph.add_edge("answer", "verifier")
@@ -170,28 +432,110 @@ graph.add_edge("explain", "verifier")
 
 # Finish points (DİKKAT: Son çağrı geçerli kalabilir)
 # Finish points
-graph.set_finish_point("verifier")
+graph.add_edge("verifier", "cache_store")
+graph.add_edge("cache_store", END)
 graph.add_edge("fallback", END)
 
 app = graph.compile()
 
-"""
-png_bytes = app.get_graph().draw_mermaid_png()
-with open("graph_diagram.png", "wb") as f:
-    f.write(png_bytes)
-"""
-mermaid_code = app.get_graph().draw_mermaid()
-with open("graph.mmd", "w") as f:
-    f.write(mermaid_code)
+def export_mermaid(path: str = "graph.mmd") -> str:
+    """
+    Write the graph as a mermaid diagram (explicit: python main_node.py --mermaid [path]).
+    PNG: app.get_graph().draw_mermaid_png() (uses the mermaid.ink API).
+    """
+    mermaid_code = app.get_graph().draw_mermaid()
+    with open(path, "w") as f:
+        f.write(mermaid_code)
+    return path
+
+# ===============================
+# Streaming entry points
+# ===============================
+# Event'ler:
+#   {"event": "token",   "node": ..., "text": ...}           agent token'ları
+#   {"event": "result",  "answer"/"code", "citations", ...}  agent / fallback / cache sonucu
+#   {"event": "verdict", "verdict", "confidence"}            verifier bitince (en sonda)
+#   {"event": "end",     "timings", "metrics"}
+#   {"event": "error",   "detail"}                        sadece server: REQUEST_TIMEOUT aşıldı
+RESULT_NODES = ("answer", "generate", "explain", "fallback")
+
+def _stream_events(mode, chunk, final: dict):
+    if mode == "custom":
+        yield {"event": "token", "node": chunk["node"], "text": chunk["token"]}
+        return
+    for node_name, update in chunk.items():
+        update = update or {}
+        timings = update.pop("timings", {})
+        metrics = update.pop("metrics", {})
+        final.update(update)
+        final.setdefault("timings", {}).update(timings)
+        final.setdefault("metrics", {}).update(metrics)
+        if node_name in RESULT_NODES or (node_name == "cache_lookup" and update.get("cache_hit")):
+            yield {
+                "event": "result",
+                "tool": final.get("tool"),
+                "path": final.get("path"),
+                "answer": final.get("answer"),
+                "code": final.get("code"),
+                "citations": final.get("citations", []),
+                "cache_hit": final.get("cache_hit", False),
+            }
+        if node_name == "verifier" or (node_name == "cache_lookup" and update.get("cache_hit")):
+            yield {"event": "verdict", "verdict": final.get("verdict"), "confidence": final.get("confidence")}
+
+def stream_pipeline(query: str, projects: List[str] = None):
+    """
+    Run the graph with token streaming; yields events (see above) as they happen.
+    The verdict arrives as a trailing event after the answer has been streamed.
+    """
+    final = {}
+    inputs = {"query": query, "stream": True, "projects": projects or []}
+    for mode, chunk in app.stream(inputs, stream_mode=["custom", "updates"]):
+        yield from _stream_events(mode, chunk, final)
+    yield {"event": "end", "timings": final.get("timings", {}), "metrics": final.get("metrics", {})}
+
+async def astream_pipeline(query: str, projects: List[str] = None):
+    """Async stream_pipeline (app.astream)."""
+    final = {}
+    inputs = {"query": query, "stream": True, "projects": projects or []}
+    async for mode, chunk in app.astream(inputs, stream_mode=["custom", "updates"]):
+        for event in _stream_events(mode, chunk, final):
+            yield event
+    yield {"event": "end", "timings": final.get("timings", {}), "metrics": final.get("metrics", {})}
+
+# ===============================
+# Async entry point
+# ===============================
+async def arun_queries(queries: List[str], concurrency: int = 32) -> List[dict]:
+    """
+    Run many queries through app.ainvoke on one event loop; at most
+    `concurrency` are in flight at once (mostly waiting on Gemini/Cohere I/O).
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(query: str):
+        async with sem:
+            return await app.ainvoke({"query": query})
+
+    return await asyncio.gather(*(run_one(q) for q in queries))
 
 # ===============================
 # Test
 # ===============================
 if __name__ == "__main__":
-    out2 = app.invoke({"query": "LangChain ile nasıl agent oluşturum?"})
-    print("\n📌 Query:", out2["query"])
-    print("📌 Tool:", out2["tool"], "| Path:", out2["path"])
-    print("📌 Code:\n", out2.get("code"))
-    print("📌 Citations:", out2.get("citations"))
-    print("📌 Verifier Verdict:", out2.get("verdict"))
-    print("📌 Confidence:", out2.get("confidence"))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run a test query through the graph or export its diagram")
+    parser.add_argument("--mermaid", nargs="?", const="graph.mmd", default=None, metavar="PATH",
+                        help="write the mermaid diagram (default: graph.mmd) and exit")
+    parser.add_argument("--query", default="LangChain ile nasıl agent oluşturum?")
+    args = parser.parse_args()
+
+    if args.mermaid:
+        print(f"[OK] {export_mermaid(args.mermaid)}")
+    else:
+        out2 = app.invoke({"query": args.query})
+        print("\n📌 Query:", out2["query"])
+        print("📌 Tool:", out2["tool"], "| Path:", out2["path"])
+        print("📌 Code:\n", out2.get("code"))
+        print("📌 Citations:", out2.get("citations"))
+        print("📌 Verifier Verdict:", out2.get("verdict"))
+        print("📌 Confidence:", out2.get("confidence"))
\ No newline at end of file
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+
+from tools.lexical import build_from_docstore
+from tools.docstore import DocstoreWriter
+from tools.vector_index import INDEX_TYPES, FAISS_INDEX_TYPE, TRAIN_SIZE, needs_training, new_index
+
+# --- Ayarlar ---
+CHUNKS_JSONL = "./scraped_docs/all_chunks.jsonl"
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
+DOCSTORE_PATH = os.path.join(DATA_DIR, "docstore.bin")
+LEXICAL_INDEX_PATH = os.path.join(DATA_DIR, "bm25.pkl")
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "embed_checkpoints")
+
+EMBED_MODEL_NAME = "BAAI/bge-m3"
+BATCH_SIZE = 512          # checkpoint başına chunk sayısı
+ENCODE_BATCH_SIZE = 32    # model.encode iç batch boyutu
+
+
+def iter_chunks_jsonl(path: str):
+    """all_chunks.jsonl dosyasını satır satır oku (tamamını belleğe almadan)"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_doc(chunk: dict) -> dict:
+    """chunk → docstore kaydı (retriever'ın okuduğu alanlar)"""
+    meta = chunk.get("metadata", {})
+    return {
+        "title": meta.get("title") or "",
+        "source": meta.get("source") or "",
+        "content": chunk.get("content", ""),
+        "project": meta.get("project"),
+        "section": meta.get("section"),
+        "chunk_id": meta.get("chunk_id"),
+        "content_hash": meta.get("content_hash"),
+    }
+
+
+class BatchEncoder:
+    """bge-m3 encoder; workers > 1 ise CPU üzerinde çok süreçli havuz kullanır"""
+
+    def __init__(self, model_name: str = EMBED_MODEL_NAME, workers: int = 1,
+                 encode_batch_size: int = ENCODE_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.encode_batch_size = encode_batch_size
+        self.pool = None
+        if workers > 1:
+            self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * workers)
+
+    def encode(self, texts):
+        emb = self.model.encode(
+            texts,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            pool=self.pool,
+        )
+        return np.asarray(emb, dtype="float32")
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+def trained_index(pending, index_type: str, train_size: int = TRAIN_SIZE, seed: int = 0):
+    """
+    pending: [(ids, emb), ...] biriktirilmiş batch'ler → en fazla train_size
+    örnekle eğitilmiş index, tüm pending vektörleri eklenmiş olarak.
+    """
+    vectors = np.vstack([emb for _, emb in pending])
+    ids = np.concatenate([batch_ids for batch_ids, _ in pending])
+    sample = vectors
+    if len(vectors) > train_size:
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+    t0 = time.perf_counter()
+    index = new_index(vectors.shape[1], index_type, train_vectors=sample)
+    print(f"[OK] {index_type} index {len(sample)} vektörle eğitildi ({time.perf_counter() - t0:.1f}s)")
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def write_atomic_index(index, index_path: str):
+    import faiss
+
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+
+def build_lexical_index(docstore_path: str, lexical_path: str):
+    """docstore'dan BM25 index'i yeniden üret (embedding yok, birkaç saniye)"""
+    t0 = time.perf_counter()
+    build_from_docstore(docstore_path, lexical_path)
+    print(f"[OK] BM25 index → {lexical_path} ({time.perf_counter() - t0:.1f}s)")
+
+
+def load_checkpoint(path: str, ids: np.ndarray):
+    """Checkpoint aynı chunk id'lerini içeriyorsa embedding'leri döndür, yoksa None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        data = np.load(path)
+        if np.array_equal(data["ids"], ids):
+            return data["emb"]
+    except Exception as e:
+        print(f"[UYARI] Bozuk checkpoint yeniden hesaplanacak: {path} ({e})")
+    return None
+
+
+def save_checkpoint(path: str, ids: np.ndarray, emb: np.ndarray):
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, ids=ids, emb=emb)
+    os.replace(tmp_path, path)
+
+
+def build_index(chunks_path: str = CHUNKS_JSONL,
+                index_path: str = FAISS_INDEX_PATH,
+                docstore_path: str = DOCSTORE_PATH,
+                lexical_path: str = LEXICAL_INDEX_PATH,
+                checkpoint_dir: str = CHECKPOINT_DIR,
+                batch_size: int = BATCH_SIZE,
+                encode_batch_size: int = ENCODE_BATCH_SIZE,
+                workers: int = 1,
+                keep_checkpoints: bool = False,
+                index_type: str = FAISS_INDEX_TYPE,
+                train_size: int = TRAIN_SIZE,
+                chunks=None):
+    """
+    all_chunks.jsonl → faiss_index.bin + docstore.bin + bm25.pkl.
+    Embedding'ler batch batch checkpoint'lenir; yarıda kalan bir çalıştırma
+    tekrar başlatıldığında hazır batch'leri atlayarak kaldığı yerden devam eder.
+    Index IndexIDMap2 olarak yazılır: FAISS doğrudan global_chunk_id döndürür ve
+    update_index.py bu id'lerle artımlı ekleme/silme yapabilir.
+    index_type: flat | hnsw | ivfpq | sq8 (bkz. tools/vector_index.py). Eğitim
+    gerektiren tiplerde ilk train_size vektör biriktirilir, index onlarla eğitilir.
+    chunks: dosya yerine chunk iterable'ı (ör. merge_json'dan akan generator).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    encoder = None
+    index = None
+    pending = []  # eğitim gereken index tipinde: index oluşana kadar (ids, emb) batch'leri
+    total, encoded, encode_secs, duplicates = 0, 0, 0.0, 0
+    started = time.perf_counter()
+
+    docstore = DocstoreWriter(docstore_path)
+    try:
+        source = chunks if chunks is not None else iter_chunks_jsonl(chunks_path)
+        for b, batch in enumerate(iter_batches(source, batch_size)):
+            ids = np.array([int(c["metadata"]["global_chunk_id"]) for c in batch], dtype="int64")
+            ckpt_path = os.path.join(checkpoint_dir, f"batch_{b:06d}.npz")
+
+            emb = load_checkpoint(ckpt_path, ids)
+            if emb is None:
+                if encoder is None:
+                    encoder = BatchEncoder(workers=workers, encode_batch_size=encode_batch_size)
+                t0 = time.perf_counter()
+                emb = encoder.encode([c.get("content", "") for c in batch])
+                encode_secs += time.perf_counter() - t0
+                encoded += len(batch)
+                save_checkpoint(ckpt_path, ids, emb)
+                rate = encoded / encode_secs if encode_secs else 0.0
+                print(f"[OK] batch {b} ({len(batch)} chunk) — {rate:.1f} chunk/s")
+            else:
+                print(f"[ATLANDI] batch {b} checkpoint'ten yüklendi")
+
+            # Docstore'un kuralı (aynı id'de ilk kayıt kalır) index'e de uygulanır: tekrar eden
+            # id'ler FAISS'e iki kez girip top-k'da aynı docstore kaydını iki kez döndürmesin
+            keep = np.array([docstore.add(gid, to_doc(chunk)) for gid, chunk in zip(ids, batch)], dtype=bool)
+            total += int(keep.sum())
+            duplicates += len(keep) - int(keep.sum())
+            if not keep.all():
+                ids, emb = ids[keep], emb[keep]
+            if not len(ids):
+                continue
+
+            if index is None and needs_training(index_type):
+                pending.append((ids, emb))
+                if sum(len(p) for p, _ in pending) >= train_size:
+                    index = trained_index(pending, index_type, train_size)
+                    pending = []
+            else:
+                if index is None:
+                    index = new_index(emb.shape[1], index_type)
+                index.add_with_ids(emb, ids)
+    except BaseException:
+        docstore.abort()
+        raise
+    finally:
+        if encoder is not None:
+            encoder.close()
+
+    if pending:
+        # corpus train_size'dan küçük: eldeki tüm vektörlerle eğit
+        index = trained_index(pending, index_type, train_size)
+
+    if index is None:
+        docstore.abort()
+        print("[HATA] Chunk yok, index oluşturulmadı.")
+        return
+
+    # Önce docstore, sonra index: arada okuyan retriever bilinmeyen id'leri atlar
+    docstore.close()
+    write_atomic_index(index, index_path)
+    build_lexical_index(docstore_path, lexical_path)
+
+    if not keep_checkpoints:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - started
+    rate = encoded / encode_secs if encode_secs else 0.0
+    print(f"[BİTTİ] {total} chunk ({encoded} yeni embedding, {index_type}) → {index_path} ve {docstore_path}")
+    if duplicates:
+        print(f"[UYARI] {duplicates} tekrar eden global_chunk_id atlandı (ilk kayıt tutuldu)")
+    print(f"[SÜRE] toplam {elapsed:.1f}s | encode {encode_secs:.1f}s | {rate:.1f} chunk/s")
+
+
+def main():
+    # repo kökünden: python -m scraper.build_index
+    parser = argparse.ArgumentParser(description="all_chunks.jsonl'dan FAISS index + docstore üret")
+    parser.add_argument("--chunks", default=CHUNKS_JSONL)
+    parser.add_argument("--index", default=FAISS_INDEX_PATH)
+    parser.add_argument("--docstore", default=DOCSTORE_PATH)
+    parser.add_argument("--lexical", default=LEXICAL_INDEX_PATH)
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="CPU encode süreç sayısı")
+    parser.add_argument("--keep-checkpoints", action="store_true")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=FAISS_INDEX_TYPE)
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE,
+                        help="ivfpq/sq8 eğitimi için kullanılacak en fazla vektör")
+    args = parser.parse_args()
+
+    build_index(
+        chunks_path=args.chunks,
+        index_path=args.index,
+        docstore_path=args.docstore,
+        lexical_path=args.lexical,
+        checkpoint_dir=args.checkpoint_dir,
+        batch_size=args.batch_size,
+        encode_batch_size=args.encode_batch_size,
+        workers=args.workers,
+        keep_checkpoints=args.keep_checkpoints,
+        index_type=args.index_type,
+        train_size=args.train_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
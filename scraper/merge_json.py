@@ -1,46 +1,137 @@
 import os
+import gzip
 import json
+import hashlib
+import argparse
 
 CHUNKED_DIR = "./scraped_docs/chunked_json"
-OUTPUT_FILE_JSON = "./scraped_docs/all_chunks.json"
+OUTPUT_FILE_JSON = "./scraped_docs/all_chunks.json"  # opsiyonel (--json)
 OUTPUT_FILE_JSONL = "./scraped_docs/all_chunks.jsonl"
 
-def merge_chunked_json():
-    all_chunks = []
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def stable_chunk_id(chunk: dict) -> int:
+    """
+    source URL + section + içerik hash'inden türetilen kalıcı id.
+    Aynı chunk her çalıştırmada aynı id'yi alır; FAISS int64 id'sine sığması için 63 bit.
+    """
+    meta = chunk.get("metadata", {})
+    key = "\x1f".join([
+        meta.get("source") or "",
+        meta.get("section") or "",
+        content_hash(chunk.get("content", "")),
+    ])
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def iter_chunked_files(chunked_dir: str = CHUNKED_DIR):
+    """chunked_json altındaki .json dosyaları, deterministik (sıralı) düzende"""
+    for root, dirs, files in os.walk(chunked_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".json"):
+                yield os.path.join(root, file)
+
+
+def iter_merged_chunks(chunked_dir: str = CHUNKED_DIR):
+    """
+    Tüm chunk'lar, global_chunk_id ve content_hash eklenmiş ve tekrarlar atılmış
+    halde, dosya dosya akar: bellekte aynı anda tek dosya + görülen id'ler durur.
+    """
+    seen_ids = set()  # aynı source/section/içerik tekrarlarını ele
+    for path in iter_chunked_files(chunked_dir):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[HATA] {path}: {e}")
+            continue
+        if not isinstance(data, list):
+            continue
+        for chunk in data:
+            # metadata’ya kalıcı global_chunk_id ekle
+            chunk.setdefault("metadata", {})
+            global_id = stable_chunk_id(chunk)
+            if global_id in seen_ids:
+                continue
+            seen_ids.add(global_id)
+            chunk["metadata"]["content_hash"] = content_hash(chunk.get("content", ""))
+            chunk["metadata"]["global_chunk_id"] = global_id
+            yield chunk
+
+
+def _open_text(path: str, tmp_path: str):
+    if path.endswith(".gz"):
+        return gzip.open(tmp_path, "wt", encoding="utf-8")
+    return open(tmp_path, "w", encoding="utf-8")
+
+
+def write_outputs(chunks, jsonl_path: str = OUTPUT_FILE_JSONL, json_path: str = None):
+    """
+    Chunk'ları geçerken JSONL'a (ve istenirse kompakt JSON dizisine, .gz ise
+    gzip'li) yazan generator; sonuna kadar tüketilince dosyalar atomik olarak
+    yerine konur. Bir index builder'a doğrudan beslenebilir.
+    """
+    targets = [jsonl_path] + ([json_path] if json_path else [])
+    tmp_paths = [path + ".tmp" for path in targets]
+    fout_jsonl = _open_text(targets[0], tmp_paths[0])
+    fout_json = _open_text(targets[1], tmp_paths[1]) if json_path else None
+    count = 0
+    try:
+        if fout_json:
+            fout_json.write("[")
+        for chunk in chunks:
+            line = json.dumps(chunk, ensure_ascii=False, separators=(",", ":"))
+            fout_jsonl.write(line + "\n")
+            if fout_json:
+                fout_json.write(("," if count else "") + line)
+            count += 1
+            yield chunk
+        if fout_json:
+            fout_json.write("]")
+    finally:
+        fout_jsonl.close()
+        if fout_json:
+            fout_json.close()
+    for tmp_path, path in zip(tmp_paths, targets):
+        os.replace(tmp_path, path)
+    print(f"[BİTTİ] {count} chunk birleşti → {', '.join(targets)}")
+
+
+def merge_chunked_json(chunked_dir: str = CHUNKED_DIR, jsonl_path: str = OUTPUT_FILE_JSONL,
+                       json_path: str = None) -> int:
+    """chunked_json → all_chunks.jsonl (+ opsiyonel JSON dizisi), sabit bellekle"""
     count = 0
-    global_id = 1  # benzersiz id için sayaç
-
-    with open(OUTPUT_FILE_JSONL, "w", encoding="utf-8") as fout_jsonl:
-        for root, _, files in os.walk(CHUNKED_DIR):
-            for file in files:
-                if not file.endswith(".json"):
-                    continue
-                path = os.path.join(root, file)
-                with open(path, "r", encoding="utf-8") as f:
-                    try:
-                        data = json.load(f)
-                        if isinstance(data, list):
-                            for chunk in data:
-                                # metadata’ya global_chunk_id ekle
-                                if "metadata" in chunk:
-                                    chunk["metadata"]["global_chunk_id"] = global_id
-                                else:
-                                    chunk["metadata"] = {"global_chunk_id": global_id}
-                                all_chunks.append(chunk)
-
-                                # JSONL olarak satır bazlı yaz
-                                fout_jsonl.write(json.dumps(chunk, ensure_ascii=False) + "\n")
-
-                                global_id += 1
-                            count += len(data)
-                    except Exception as e:
-                        print(f"[HATA] {path}: {e}")
-
-    # Tek JSON kaydet
-    with open(OUTPUT_FILE_JSON, "w", encoding="utf-8") as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-
-    print(f"[BİTTİ] {count} chunk birleşti → {OUTPUT_FILE_JSON} ve {OUTPUT_FILE_JSONL}")
+    for _ in write_outputs(iter_merged_chunks(chunked_dir), jsonl_path, json_path):
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chunked_json dosyalarını all_chunks.jsonl'da birleştir")
+    parser.add_argument("--chunked-dir", default=CHUNKED_DIR)
+    parser.add_argument("--jsonl", default=OUTPUT_FILE_JSONL)
+    parser.add_argument("--json", default=None,
+                        help=f"ek olarak kompakt JSON dizisi yaz (ör. {OUTPUT_FILE_JSON}; .gz → gzip)")
+    parser.add_argument("--index", choices=("build", "update"), default=None,
+                        help="chunk'ları birleştirirken doğrudan index builder'a / updater'a besle")
+    args = parser.parse_args()
+
+    chunks = write_outputs(iter_merged_chunks(args.chunked_dir), args.jsonl, args.json)
+    if args.index == "build":
+        from scraper.build_index import build_index
+        build_index(chunks=chunks)
+    elif args.index == "update":
+        from scraper.update_index import update_index
+        update_index(chunks=chunks)
+    else:
+        for _ in chunks:
+            pass
+
 
 if __name__ == "__main__":
-    merge_chunked_json()
\ No newline at end of file
+    # repo kökünden: python -m scraper.merge_json [--json ./scraped_docs/all_chunks.json.gz] [--index update]
+    main()
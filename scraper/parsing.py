@@ -1,12 +1,17 @@
 import os
 import json
 import re
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_text_splitters.base import Language
 
 RAW_MD_DIR = "./scraped_docs/raw_md"
 RAW_JSON_DIR = "./scraped_docs/raw_json"
 CHUNKED_DIR = "./scraped_docs/chunked_json"
+MANIFEST_PATH = "./scraped_docs/chunk_manifest.json"  # md path → kaynak hash'i
 os.makedirs(CHUNKED_DIR, exist_ok=True)
 
 # Chunk ayarları
@@ -35,59 +40,97 @@ def load_raw_meta(project: str, filename_md: str):
     except Exception:
         return None
 
-def extract_titles(md_text: str):
-    """Markdown içinden başlıkları çıkar"""
+def extract_headers(md_text: str):
+    """H1 başlığı ve (offset, başlık) listesi: her H2/H3 satırının metindeki başlangıç konumu"""
     title = None
-    sections = []
-
-    for line in md_text.splitlines():
-        if line.startswith("# "):  # H1
+    headers = []
+    offset = 0
+    for line in md_text.splitlines(keepends=True):
+        if line.startswith("# "):
             if not title:
                 title = line.lstrip("#").strip()
-        elif line.startswith("## "):  # H2
-            sections.append(line.lstrip("#").strip())
-        elif line.startswith("### "):  # H3
-            sections.append(line.lstrip("#").strip())
-
-    return title, sections
-
-def chunk_markdown_file(md_path: str):
+        elif line.startswith("## ") or line.startswith("### "):
+            headers.append((offset, line.lstrip("#").strip()))
+        offset += len(line)
+    return title, headers
+
+def assign_sections(docs, headers):
+    """
+    Tek doğrusal geçiş (chunk'lar ve başlıklar ikisi de offset sıralı): chunk bir
+    başlık satırı içeriyorsa içindeki ilk başlık, içermiyorsa başlangıcından önceki
+    son başlık (ör. "## Setup … ### Install" chunk'ından sonra gelen, sadece
+    Install gövdesini içeren chunk "Install" alır). Başlık metninin chunk'ta
+    geçmesine değil, başlık satırının offset'ine bakılır.
+    """
+    sections = []
+    h = 0
+    current = None
+    for doc in docs:
+        start = doc.metadata["start_index"]
+        end = start + len(doc.page_content)
+        while h < len(headers) and headers[h][0] < start:
+            current = headers[h][1]
+            h += 1
+        if h < len(headers) and headers[h][0] < end:
+            sections.append(headers[h][1])
+        else:
+            sections.append(current)
+    return sections
+
+_splitter = None
+
+def get_splitter():
+    """Süreç başına tek splitter (her dosyada yeniden kurulmaz)"""
+    global _splitter
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            separators=["\n## ", "\n# ", "\n", " ", ""],
+            add_start_index=True,
+        )
+    return _splitter
+
+def source_hash(md_text: str, raw_meta) -> str:
+    """Çıktıyı belirleyen her şeyin hash'i: markdown, raw_json meta ve chunk ayarları"""
+    h = hashlib.sha1()
+    h.update(f"{CHUNK_SIZE}:{CHUNK_OVERLAP}\n".encode("utf-8"))
+    h.update(json.dumps(raw_meta, sort_keys=True).encode("utf-8"))
+    h.update(md_text.encode("utf-8"))
+    return h.hexdigest()
+
+def chunk_output_path(md_path: str) -> str:
+    """raw_md/<project>/<name>.md → chunked_json/<project>/<name>.json"""
+    base_name = os.path.splitext(os.path.basename(md_path))[0]
+    return os.path.join(CHUNKED_DIR, get_project_from_path(md_path), base_name + ".json")
+
+def chunk_markdown_file(md_path: str, previous_hash: str = None):
+    """
+    md dosyasını chunk'layıp chunked_json'a yazar. Kaynak hash'i previous_hash ile
+    aynıysa ve çıktı duruyorsa hiçbir şey yazmaz.
+    Döner: (md_path, "ok" | "skipped", source_hash, chunk sayısı)
+    """
     with open(md_path, "r", encoding="utf-8") as f:
         md_text = f.read()
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n## ", "\n# ", "\n", " ", ""]
-    )
-
-    docs = splitter.create_documents([md_text])
-
     project = get_project_from_path(md_path)
-    out_dir = os.path.join(CHUNKED_DIR, project)
-    os.makedirs(out_dir, exist_ok=True)
-
     base_name = os.path.splitext(os.path.basename(md_path))[0]
-    out_path = os.path.join(out_dir, base_name + ".json")
+    out_path = chunk_output_path(md_path)
+    out_dir = os.path.dirname(out_path)
 
     raw_meta = load_raw_meta(project, base_name + ".md")
+    digest = source_hash(md_text, raw_meta)
+    if digest == previous_hash and os.path.exists(out_path):
+        return md_path, "skipped", digest, 0
 
-    # Başlıkları çıkar
-    page_title, sections = extract_titles(md_text)
+    docs = get_splitter().create_documents([md_text])
 
-    out_data = []
-    current_section = None
-    for i, doc in enumerate(docs, 1):
-        # hangi section’a düştüğünü tahmin et (en son görülen başlık)
-        section = None
-        for sec in sections:
-            if sec in doc.page_content:
-                section = sec
-                current_section = sec
-                break
-        if not section:
-            section = current_section
+    # Başlıkları çıkar, section'ları offset'lere göre ata
+    page_title, headers = extract_headers(md_text)
+    sections = assign_sections(docs, headers)
 
+    out_data = []
+    for i, (doc, section) in enumerate(zip(docs, sections), 1):
         out_data.append({
             "content": doc.page_content,
             "metadata": {
@@ -99,28 +142,102 @@ def chunk_markdown_file(md_path: str):
             }
         })
 
+    os.makedirs(out_dir, exist_ok=True)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(out_data, f, ensure_ascii=False, indent=2)
 
     print(f"[OK] {md_path} → {out_path} ({len(out_data)} chunk)")
+    return md_path, "ok", digest, len(out_data)
 
-def process_all(limit=None):
+def load_manifest(path: str = MANIFEST_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest: dict, path: str = MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def iter_md_files(limit=None):
     count = 0
     for root, _, files in os.walk(RAW_MD_DIR):
-        for file in files:
+        for file in sorted(files):
             if not file.endswith(".md"):
                 continue
-            md_path = os.path.join(root, file)
-            chunk_markdown_file(md_path)
+            yield os.path.join(root, file)
             count += 1
             if limit and count >= limit:
-                print(f"[BİTTİ] {limit} dosya işlendi (test modu).")
                 return
-    print(f"[BİTTİ] Toplam {count} dosya işlendi.")
 
-if __name__ == "__main__":
-    # test için önce 2 dosya çalıştır
-    # process_all(limit=2)
+def _chunk_job(args):
+    return chunk_markdown_file(*args)
+
+def remove_stale_outputs(md_paths) -> int:
+    """
+    Kaynağı (raw_md dosyası) artık olmayan chunked_json çıktılarını siler; yoksa
+    merge_json / update_index silinmiş sayfaları indekslemeye devam eder.
+    """
+    expected = {os.path.normpath(chunk_output_path(p)) for p in md_paths}
+    removed = 0
+    for root, _, files in os.walk(CHUNKED_DIR):
+        for file in files:
+            path = os.path.normpath(os.path.join(root, file))
+            if file.endswith(".json") and path not in expected:
+                os.remove(path)
+                removed += 1
+                print(f"[SİLİNDİ] {path}")
+    return removed
+
+def process_all(limit=None, workers: int = None, force: bool = False):
+    """
+    raw_md altındaki tüm dosyaları chunk'lar. workers > 1 ise süreç havuzu
+    (her süreç tek splitter kullanır). Kaynak hash'i manifest'teki ile aynı olan
+    dosyalar atlanır; force=True hepsini yeniden üretir. Kaynağı silinmiş
+    çıktılar (limit yoksa) silinir.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    manifest = load_manifest()
+    md_paths = list(iter_md_files(limit))
+    jobs = [(md_path, None if force else manifest.get(md_path)) for md_path in md_paths]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_chunk_job, jobs, chunksize=8))
+    else:
+        results = [_chunk_job(job) for job in jobs]
+
+    new_manifest = {}
+    counts = {"ok": 0, "skipped": 0}
+    for md_path, status, digest, _ in results:
+        new_manifest[md_path] = digest
+        counts[status] += 1
+    if limit:
+        # limit'li (test) çalıştırmada görülmeyen dosyaların kaydı korunur, silme yapılmaz
+        new_manifest = {**manifest, **new_manifest}
+        removed = 0
+    else:
+        # Silinen md dosyalarının manifest kaydı düşer, çıktıları silinir
+        removed = remove_stale_outputs(md_paths)
+    save_manifest(new_manifest)
+
+    elapsed = time.perf_counter() - started
+    print(f"[BİTTİ] Toplam {len(results)} dosya: {counts['ok']} chunk'landı, "
+          f"{counts['skipped']} değişmemiş, {removed} silindi ({elapsed:.1f}s, {workers} süreç)")
+
+def main():
+    parser = argparse.ArgumentParser(description="raw_md → chunked_json")
+    parser.add_argument("--limit", type=int, default=None, help="test için ilk N dosya")
+    parser.add_argument("--workers", type=int, default=None, help="süreç sayısı (varsayılan: CPU sayısı)")
+    parser.add_argument("--force", action="store_true", help="değişmemiş dosyaları da yeniden chunk'la")
+    args = parser.parse_args()
+    process_all(limit=args.limit, workers=args.workers, force=args.force)
 
-    # tamamına koşmak için:
-    process_all()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,90 @@ import os
 import re
 import json
 import time
+import argparse
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- Ayarlar ---
 TXT_URL = "https://docs.langchain.com/llms.txt"
 OUTPUT_DIR = "./scraped_docs"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-
-def fetch_txt(url):
+CONCURRENCY = int(os.getenv("SCRAPER_CONCURRENCY", "8"))
+RATE_LIMIT = float(os.getenv("SCRAPER_RATE_LIMIT", "4"))      # saniyede en fazla istek (0 = sınırsız)
+MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("SCRAPER_BACKOFF", "0.5"))   # 0.5s, 1s, 2s, ... (Retry-After'a uyulur)
+TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", "10"))
+USER_AGENT = "agentic-rag-scraper/1.0"
+
+
+class RateLimiter:
+    """İstekleri thread'ler arasında en az 1/rate saniye aralıklarla başlatır"""
+
+    def __init__(self, rate: float = RATE_LIMIT):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LimitedRetry(Retry):
+    """
+    urllib3 Retry that takes a RateLimiter slot before every retry (adapter-level
+    retries never pass through fetch_entry's limiter.wait()).
+    """
+
+    limiter = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.limiter = self.limiter  # Retry her denemede yeni nesne üretir
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)  # backoff / Retry-After
+        if self.limiter is not None:
+            self.limiter.wait()
+
+
+def make_session(pool_size: int = CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 backoff_factor: float = BACKOFF_FACTOR, limiter: RateLimiter = None) -> requests.Session:
+    """
+    Bağlantı havuzlu Session; 429/5xx ve bağlantı hataları backoff ile tekrar denenir.
+    limiter verilirse tekrar denemeler de hız sınırına tabidir.
+    """
+    retry = LimitedRetry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    retry.limiter = limiter
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def fetch_txt(url, session: requests.Session = None):
     """llms.txt içeriğini getir"""
     try:
-        resp = requests.get(url, timeout=10)
+        resp = (session or requests).get(url, timeout=TIMEOUT)
         if resp.status_code == 200:
             return resp.text.splitlines()
     except Exception as e:
@@ -26,7 +97,7 @@ def parse_llms(lines):
     """llms.txt satırlarını title, url, summary olarak ayır"""
     entries = []
     for line in lines:
-        match = re.match(r"- \[(.+?)\]\((https://[^\s)]+\.md)\)(?:: (.*))?", line.strip())
+        match = re.match(r"- \[(.+?)\]\((https?://[^\s)]+\.md)\)(?:: (.*))?", line.strip())
         if match:
             title, url, summary = match.groups()
             entries.append({
@@ -46,50 +117,132 @@ def get_project_name(url):
     return "misc"
 
 
-def save_markdown(entry, content):
-    """Markdown ve JSON kaydet"""
+def _paths(entry, output_dir: str):
     project = get_project_name(entry["url"])
     filename = os.path.basename(entry["url"])  # orijinal .md dosya adı
+    md_path = os.path.join(output_dir, "raw_md", project, filename)
+    json_path = os.path.join(output_dir, "raw_json", project, filename.replace(".md", ".json"))
+    return md_path, json_path
+
+
+def load_meta(entry, output_dir: str = OUTPUT_DIR):
+    """Önceki indirmenin raw_json kaydı (etag / last_modified için), yoksa None"""
+    md_path, json_path = _paths(entry, output_dir)
+    if not (os.path.exists(md_path) and os.path.exists(json_path)):
+        return None
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def conditional_headers(meta) -> dict:
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def save_markdown(entry, content, output_dir: str = OUTPUT_DIR, etag=None, last_modified=None):
+    """Markdown ve JSON kaydet"""
+    md_path, json_path = _paths(entry, output_dir)
 
     # Markdown kaydet
-    md_dir = os.path.join(OUTPUT_DIR, "raw_md", project)
-    os.makedirs(md_dir, exist_ok=True)
-    md_path = os.path.join(md_dir, filename)
+    os.makedirs(os.path.dirname(md_path), exist_ok=True)
     with open(md_path, "w", encoding="utf-8") as f:
         f.write(content)
 
-    # JSON kaydet
-    json_dir = os.path.join(OUTPUT_DIR, "raw_json", project)
-    os.makedirs(json_dir, exist_ok=True)
+    # JSON kaydet (etag / last_modified bir sonraki çalıştırmada koşullu istek için)
+    os.makedirs(os.path.dirname(json_path), exist_ok=True)
     data = {
         "url": entry["url"],
         "title": entry["title"],
         "markdown": content,
-        "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S")
+        "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "etag": etag,
+        "last_modified": last_modified,
     }
-    json_path = os.path.join(json_dir, filename.replace(".md", ".json"))
     with open(json_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
-def download_markdowns(txt_url, limit=None):
+def fetch_entry(session: requests.Session, entry, output_dir: str = OUTPUT_DIR,
+                limiter: RateLimiter = None) -> str:
+    """Tek sayfayı indir: "ok" | "not_modified" | "failed" """
+    headers = conditional_headers(load_meta(entry, output_dir))
+    if limiter is not None:
+        limiter.wait()
+    try:
+        resp = session.get(entry["url"], headers=headers, timeout=TIMEOUT)
+    except Exception as e:
+        print(f"[HATA] {entry['url']}: {e}")
+        return "failed"
+
+    if resp.status_code == 304:
+        return "not_modified"
+    if resp.status_code != 200:
+        print(f"[HATA] {entry['url']}: HTTP {resp.status_code}")
+        return "failed"
+
+    # Sadece sunucunun gönderdiği değerler saklanır: istemci saatiyle If-Modified-Since
+    # göndermek saat farkında değişmiş sayfaya 304 aldırabilir (o zaman sadece ETag kullanılır)
+    try:
+        save_markdown(entry, resp.text, output_dir, etag=resp.headers.get("ETag"),
+                      last_modified=resp.headers.get("Last-Modified"))
+    except Exception as e:
+        # disk dolu / izin / geçersiz yol: diğer sayfalar devam etsin, sayfa "failed" sayılır
+        print(f"[HATA] {entry['url']}: kaydedilemedi: {e}")
+        return "failed"
+    print(f"[OK] {entry['title']} → {entry['url']}")
+    return "ok"
+
+
+def download_markdowns(txt_url=TXT_URL, limit=None, output_dir: str = OUTPUT_DIR,
+                       concurrency: int = CONCURRENCY, rate: float = RATE_LIMIT,
+                       session: requests.Session = None) -> dict:
+    """
+    llms.txt'deki sayfaları `concurrency` thread ile, saniyede en fazla `rate`
+    istekle indirir (backoff tekrarları dahil; dışarıdan verilen session'da
+    tekrarlar limiter'ı görmez). Daha önce indirilen sayfalar koşullu istenir
+    (ETag / Last-Modified); 304 dönenler tekrar yazılmaz.
+    """
     print(f"[BAŞLIYOR] {txt_url}")
-    lines = fetch_txt(txt_url)
-    entries = parse_llms(lines)
+    os.makedirs(output_dir, exist_ok=True)
+    limiter = RateLimiter(rate)
+    session = session or make_session(pool_size=concurrency, limiter=limiter)
+    started = time.perf_counter()
 
+    entries = parse_llms(fetch_txt(txt_url, session))
     if limit:
         entries = entries[:limit]
 
-    for i, entry in enumerate(entries, 1):
-        try:
-            resp = requests.get(entry["url"], timeout=10)
-            if resp.status_code == 200:
-                save_markdown(entry, resp.text)
-                print(f"[OK] {entry['title']} → {entry['url']}")
-        except Exception as e:
-            print(f"[HATA] {entry['url']}: {e}")
-        time.sleep(0.5)
+    stats = {"ok": 0, "not_modified": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scraper") as pool:
+        for status in pool.map(lambda e: fetch_entry(session, e, output_dir, limiter), entries):
+            stats[status] += 1
+
+    elapsed = time.perf_counter() - started
+    print(f"[BİTTİ] {len(entries)} sayfa: {stats['ok']} indirildi, {stats['not_modified']} değişmemiş, "
+          f"{stats['failed']} hata ({elapsed:.1f}s)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="llms.txt'deki dokümantasyon sayfalarını indir")
+    parser.add_argument("--txt-url", default=TXT_URL)
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE_LIMIT, help="saniyede en fazla istek (0 = sınırsız)")
+    args = parser.parse_args()
+
+    download_markdowns(args.txt_url, limit=args.limit, output_dir=args.out,
+                       concurrency=args.concurrency, rate=args.rate)
 
 
 if __name__ == "__main__":
-    download_markdowns(TXT_URL, limit=1000)  # önce test için 20 sayfa
\ No newline at end of file
+    main()
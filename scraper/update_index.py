@@ -0,0 +1,128 @@
+"""
+Artımlı index güncelleme (repo kökünden: python -m scraper.update_index).
+
+global_chunk_id, source + section + içerik hash'inden türetildiği için
+(bkz. merge_json.stable_chunk_id) değişen bir chunk yeni bir id alır:
+  - yeni id'ler      → embed edilip index'e eklenir
+  - kaybolan id'ler  → IndexIDMap2.remove_ids ile silinir (HNSW silme desteklemez,
+                       graph kalan vektörlerden yeniden kurulur)
+  - aynı kalanlar    → dokunulmaz (yeniden embed yok)
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+from scraper.build_index import (
+    CHUNKS_JSONL,
+    FAISS_INDEX_PATH,
+    DOCSTORE_PATH,
+    LEXICAL_INDEX_PATH,
+    BATCH_SIZE,
+    ENCODE_BATCH_SIZE,
+    BatchEncoder,
+    iter_batches,
+    iter_chunks_jsonl,
+    to_doc,
+    write_atomic_index,
+    build_index,
+    build_lexical_index,
+)
+from tools.vector_index import index_type_of, remove_ids
+from tools.docstore import Docstore, DocstoreWriter
+
+
+def update_index(chunks_path: str = CHUNKS_JSONL,
+                 index_path: str = FAISS_INDEX_PATH,
+                 docstore_path: str = DOCSTORE_PATH,
+                 lexical_path: str = LEXICAL_INDEX_PATH,
+                 batch_size: int = BATCH_SIZE,
+                 encode_batch_size: int = ENCODE_BATCH_SIZE,
+                 workers: int = 1,
+                 chunks=None):
+    """
+    Sadece yeni/değişen chunk'ları embed eder, silinenleri index'ten çıkarır ve
+    güncel index + docstore'u atomik olarak (tmp → os.replace) yerine koyar.
+    chunks: dosya yerine chunk iterable'ı (ör. merge_json'dan akan generator).
+    """
+    import faiss
+
+    if not (os.path.exists(index_path) and os.path.exists(docstore_path)):
+        print("[BİLGİ] Mevcut index yok, tam build yapılıyor.")
+        return build_index(chunks_path, index_path, docstore_path, lexical_path, batch_size=batch_size,
+                           encode_batch_size=encode_batch_size, workers=workers, chunks=chunks)
+
+    index = faiss.read_index(index_path)
+    if not hasattr(index, "id_map"):
+        print("[HATA] Index id tabanlı değil (eski format). Önce tam build çalıştırın: python -m scraper.build_index")
+        return
+
+    old_docstore = Docstore(docstore_path)
+    old_ids = set(old_docstore.ids.tolist())
+    old_docstore.close()
+
+    started = time.perf_counter()
+    to_embed = []
+    docstore = DocstoreWriter(docstore_path)
+    try:
+        for chunk in (chunks if chunks is not None else iter_chunks_jsonl(chunks_path)):
+            gid = int(chunk["metadata"]["global_chunk_id"])
+            if docstore.add(gid, to_doc(chunk)) and gid not in old_ids:
+                to_embed.append((gid, chunk.get("content", "")))
+        new_ids = docstore.ids
+
+        removed = np.array(sorted(old_ids - new_ids), dtype="int64")
+        index = remove_ids(index, removed)
+
+        encode_secs = 0.0
+        if to_embed:
+            encoder = BatchEncoder(workers=workers, encode_batch_size=encode_batch_size)
+            try:
+                for batch in iter_batches(to_embed, batch_size):
+                    ids = np.array([gid for gid, _ in batch], dtype="int64")
+                    t0 = time.perf_counter()
+                    emb = encoder.encode([text for _, text in batch])
+                    encode_secs += time.perf_counter() - t0
+                    index.add_with_ids(emb, ids)
+            finally:
+                encoder.close()
+    except BaseException:
+        docstore.abort()
+        raise
+
+    # Önce docstore, sonra index: arada okuyan retriever bilinmeyen id'leri atlar
+    docstore.close()
+    write_atomic_index(index, index_path)
+    build_lexical_index(docstore_path, lexical_path)
+
+    elapsed = time.perf_counter() - started
+    rate = len(to_embed) / encode_secs if encode_secs else 0.0
+    print(f"[BİTTİ] +{len(to_embed)} yeni/değişen, -{len(removed)} silinen, "
+          f"{len(new_ids) - len(to_embed)} aynı → toplam {index.ntotal} vektör ({index_type_of(index)})")
+    print(f"[SÜRE] toplam {elapsed:.1f}s | encode {encode_secs:.1f}s | {rate:.1f} chunk/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS index + docstore'u artımlı güncelle")
+    parser.add_argument("--chunks", default=CHUNKS_JSONL)
+    parser.add_argument("--index", default=FAISS_INDEX_PATH)
+    parser.add_argument("--docstore", default=DOCSTORE_PATH)
+    parser.add_argument("--lexical", default=LEXICAL_INDEX_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="CPU encode süreç sayısı")
+    args = parser.parse_args()
+
+    update_index(
+        chunks_path=args.chunks,
+        index_path=args.index,
+        docstore_path=args.docstore,
+        lexical_path=args.lexical,
+        batch_size=args.batch_size,
+        encode_batch_size=args.encode_batch_size,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+HTTP serving layer around the compiled LangGraph pipeline.
+
+    uvicorn server:api --host 0.0.0.0 --port 8000
+    # veya: python server.py
+"""
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+
+from main_node import app as pipeline, astream_pipeline, warmup
+from tools.retriever import start_batching, stop_batching, batching_stats
+from tools.planner import router_stats
+from tools.llm_cache import memo_stats
+from tools.semantic_cache import get_semantic_cache, SEMANTIC_CACHE_ENABLED
+from tools.verifier_agent import verdict_store
+from tools.metrics import render_prometheus
+
+# ===============================
+# Settings
+# ===============================
+MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "32"))  # aynı anda graph'ta koşan istek
+MAX_PENDING = int(os.getenv("SERVER_MAX_PENDING", "256"))         # sırada bekleyebilecek istek
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "5"))
+REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "120"))
+
+_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+_pending = 0    # kabul edilmiş (kuyrukta + çalışan) istek sayısı
+_in_flight = 0  # graph'ta çalışan istek sayısı
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Model + index + LLM/rerank client'larını ilk istekten önce yükle (import lazy),
+    # batcher'ları bu event loop'ta başlat
+    await asyncio.to_thread(warmup)
+    start_batching(max_batch=BATCH_MAX_SIZE, window_ms=BATCH_WINDOW_MS)
+    yield
+    await stop_batching()
+
+
+api = FastAPI(title="agentic-rag", lifespan=lifespan)
+
+
+class QueryRequest(BaseModel):
+    query: str
+    projects: List[str] = []  # ör. ["langgraph"]: retrieval sadece bu projelerin dokümanlarında
+
+
+class QueryResponse(BaseModel):
+    query: str
+    tool: Optional[str] = None
+    path: Optional[str] = None
+    answer: Optional[str] = None
+    code: Optional[str] = None
+    citations: List[dict] = []
+    verdict: Optional[str] = None
+    confidence: Optional[float] = None
+    verified_by: Optional[str] = None
+    verification_id: Optional[str] = None
+    cache_hit: bool = False
+    timings: dict = {}
+    metrics: dict = {}  # node başına LLM/encode/search/rerank süreleri, token'lar, cache sonuçları
+
+
+@api.post("/query", response_model=QueryResponse)
+async def query(req: QueryRequest):
+    global _pending, _in_flight
+    # Backpressure: kuyruk doluysa bekletmek yerine hemen 503 dön
+    if _pending >= MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Server busy, retry later.", headers={"Retry-After": "1"})
+
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        async with _slots:
+            queued = time.perf_counter() - started
+            _in_flight += 1
+            try:
+                out = await asyncio.wait_for(pipeline.ainvoke({"query": req.query, "projects": req.projects}), timeout=REQUEST_TIMEOUT)
+            finally:
+                _in_flight -= 1
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Pipeline timed out.")
+    finally:
+        _pending -= 1
+
+    timings = dict(out.get("timings", {}))
+    timings["queue"] = round(queued, 4)
+    timings["total"] = round(time.perf_counter() - started, 4)
+    return QueryResponse(**{**out, "timings": timings})
+
+
+@api.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """NDJSON stream: token events, then the result, then the verdict (see main_node.stream_pipeline)."""
+    global _pending
+    if _pending >= MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Server busy, retry later.", headers={"Retry-After": "1"})
+    # Slot kontrolle aynı adımda ayrılır: eşzamanlı bir istek patlaması 503 sınırını geçemesin.
+    # Generator hiç başlamazsa (istemci ilk iterasyondan önce koparsa) finally çalışmaz;
+    # bu yüzden release hem generator'dan hem response'un BackgroundTask'ından çağrılır, bir kez etkili olur.
+    _pending += 1
+    released = False
+
+    async def release():
+        global _pending
+        nonlocal released
+        if not released:
+            released = True
+            _pending -= 1
+
+    async def events():
+        global _in_flight
+        started = time.perf_counter()
+        try:
+            async with _slots:
+                _in_flight += 1
+                try:
+                    # /query ile aynı üst sınır: takılan bir stream _slots iznini tutamasın
+                    async with asyncio.timeout(REQUEST_TIMEOUT):
+                        async for event in astream_pipeline(req.query, req.projects):
+                            if event["event"] == "end":
+                                event["timings"]["total"] = round(time.perf_counter() - started, 4)
+                            yield json.dumps(event, ensure_ascii=False) + "\n"
+                except TimeoutError:
+                    yield json.dumps({"event": "error", "detail": "Pipeline timed out."}) + "\n"
+                finally:
+                    _in_flight -= 1
+        finally:
+            await release()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
+@api.get("/verdict/{verification_id}")
+async def verdict(verification_id: str):
+    """Result of a background (VERIFIER_POLICY=async) verification."""
+    result = verdict_store.get(verification_id)
+    if result is None:
+        return {"verification_id": verification_id, "verdict": "pending"}
+    return {"verification_id": verification_id, **result}
+
+
+@api.get("/health")
+async def health():
+    return {"status": "ok", "in_flight": _in_flight, "pending": _pending}
+
+
+@api.get("/stats")
+async def stats():
+    return {
+        "batching": batching_stats(),
+        "router": router_stats(),
+        "llm_memo": memo_stats(),
+        "semantic_cache": get_semantic_cache().stats() if SEMANTIC_CACHE_ENABLED else None,
+    }
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: node / stage latency histograms, token, cache and payload counters."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(api, host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "8000")))
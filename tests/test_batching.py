@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from tools.batching import MicroBatcher
+from tools.metrics import node_scope, timed
+
+
+def test_results_keep_submission_order():
+    async def main():
+        batcher = MicroBatcher("test", lambda items: [i * 2 for i in items], window_ms=20)
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(main())
+    assert results == [0, 2, 4, 6, 8]
+    assert stats["items"] == 5
+
+
+def test_stop_fails_waiting_callers():
+    async def main():
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def slow(items):
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            return items
+
+        batcher = MicroBatcher("test", slow, max_batch=1, window_ms=0)
+        batcher.start()
+        calls = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 1)
+
+    results = asyncio.run(main())
+    assert len(results) == 3
+    for r in results:
+        assert isinstance(r, RuntimeError) and str(r) == "batcher stopped"
+
+
+def test_batch_timings_reach_caller_scope():
+    def encode(items):
+        with timed("encode"):
+            return items
+
+    async def main():
+        batcher = MicroBatcher("test", encode)
+        batcher.start()
+        with node_scope() as breakdown:
+            await batcher.submit("q")
+        await batcher.stop()
+        return breakdown
+
+    breakdown = asyncio.run(main())
+    assert "encode" in breakdown["seconds"]
+
+
+def test_batch_errors_reach_callers():
+    def boom(items):
+        raise ValueError("bad batch")
+
+    async def main():
+        batcher = MicroBatcher("test", boom)
+        batcher.start()
+        try:
+            with pytest.raises(ValueError, match="bad batch"):
+                await batcher.submit(1)
+        finally:
+            await batcher.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+import json
+
+from scraper.merge_json import stable_chunk_id, iter_merged_chunks
+
+SOURCE = "https://docs.langchain.com/langgraph/persistence.md"
+
+
+def chunk(content="Use a checkpointer.", section="Checkpointers", source=SOURCE):
+    return {"content": content, "metadata": {"source": source, "section": section}}
+
+
+def test_stable_chunk_id_is_pinned():
+    # Kalıcı id: index, docstore ve citation'lar buna bağlı; değişirse tam rebuild gerekir
+    assert stable_chunk_id(chunk()) == 3537346122642225493
+
+
+def test_stable_chunk_id_fits_faiss_int64():
+    for i in range(100):
+        assert 0 <= stable_chunk_id(chunk(content=f"chunk {i}")) < 2**63
+
+
+def test_stable_chunk_id_depends_on_source_section_and_content():
+    base = stable_chunk_id(chunk())
+    assert stable_chunk_id(chunk()) == base
+    assert stable_chunk_id(chunk(section="Install")) != base
+    assert stable_chunk_id(chunk(source=SOURCE + "?v=2")) != base
+    assert stable_chunk_id(chunk(content="Use a store.")) != base
+
+
+def test_stable_chunk_id_ignores_other_metadata():
+    extra = chunk()
+    extra["metadata"].update({"title": "Persistence", "chunk_id": 7, "project": "langgraph"})
+    assert stable_chunk_id(extra) == stable_chunk_id(chunk())
+
+
+def test_missing_section_equals_empty_section():
+    no_section = {"content": "Use a checkpointer.", "metadata": {"source": SOURCE}}
+    assert stable_chunk_id(no_section) == stable_chunk_id(chunk(section=None)) == stable_chunk_id(chunk(section=""))
+
+
+def test_iter_merged_chunks_drops_duplicates_and_adds_ids(tmp_path):
+    project = tmp_path / "langgraph"
+    project.mkdir()
+    (project / "a.json").write_text(json.dumps([chunk(), chunk(section="Install")]), encoding="utf-8")
+    (project / "b.json").write_text(json.dumps([chunk()]), encoding="utf-8")
+
+    merged = list(iter_merged_chunks(str(tmp_path)))
+
+    assert [c["metadata"]["section"] for c in merged] == ["Checkpointers", "Install"]
+    assert merged[0]["metadata"]["global_chunk_id"] == stable_chunk_id(chunk())
+    assert merged[0]["metadata"]["content_hash"]
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from scraper.parsing import extract_headers, assign_sections
+
+
+def split(text, spans):
+    """Splitter çıktısı yerine: (start, end) aralıklarından start_index'li chunk'lar."""
+    return [SimpleNamespace(page_content=text[s:e], metadata={"start_index": s}) for s, e in spans]
+
+
+MD = (
+    "# Persistence\n"
+    "Intro text.\n"
+    "## Setup\n"
+    "Setup body.\n"
+    "### Install\n"
+    "Install body, part one.\n"
+    "Install body, part two.\n"
+    "## Usage\n"
+    "Usage body.\n"
+)
+
+
+def test_extract_headers_offsets():
+    title, headers = extract_headers(MD)
+    assert title == "Persistence"
+    assert [name for _, name in headers] == ["Setup", "Install", "Usage"]
+    for offset, name in headers:
+        assert MD[offset:].split("\n", 1)[0].lstrip("#").strip() == name
+
+
+def test_chunk_without_header_takes_last_preceding_header():
+    # "## Setup … ### Install" tek chunk, sonraki chunk sadece Install gövdesi
+    _, headers = extract_headers(MD)
+    setup, usage = MD.index("## Setup"), MD.index("## Usage")
+    part_two = MD.index("Install body, part two.")
+    docs = split(MD, [(setup, part_two), (part_two, usage), (usage, len(MD))])
+    assert assign_sections(docs, headers) == ["Setup", "Install", "Usage"]
+
+
+def test_chunk_takes_first_header_inside_it():
+    _, headers = extract_headers(MD)
+    docs = split(MD, [(0, MD.index("## Setup")), (MD.index("Setup body."), len(MD))])
+    assert assign_sections(docs, headers) == [None, "Install"]
+
+
+def test_header_text_in_body_does_not_count():
+    md = "## Setup\nSee Usage below.\n## Usage\nUsage body.\n"
+    _, headers = extract_headers(md)
+    body = md.index("See")
+    docs = split(md, [(0, body), (body, md.index("## Usage")), (md.index("## Usage"), len(md))])
+    assert assign_sections(docs, headers) == ["Setup", "Setup", "Usage"]
+
+
+def test_overlapping_chunks():
+    _, headers = extract_headers(MD)
+    usage = MD.index("## Usage")
+    # overlap: ikinci chunk birinci chunk'ın içindeki Install başlığından önce başlıyor
+    docs = split(MD, [(0, MD.index("Install body")), (MD.index("Setup body."), usage + 3)])
+    assert assign_sections(docs, headers) == ["Setup", "Install"]
+
+
+def test_no_headers():
+    docs = split("plain text\n" * 10, [(0, 50), (40, 110)])
+    assert assign_sections(docs, []) == [None, None]
@@ -1,31 +1,23 @@
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
+from tools.llm import complete, acomplete, get_chat_model
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+ANSWER_MODEL = "gemini-1.5-flash"
 
-def run_answer(query: str, context: str, citations: list, mode: str = "qa") -> dict:
-    """
-    Unified Answer Agent.
-    mode = "qa"     → factual short answer
-    mode = "howto"  → step-by-step instructions
-    """
-    if not context.strip():
-        return {
-            "answer": "Bu soruya cevap veremem çünkü ilgili bilgi tabanında bulunmuyor.",
-            "citations": [],
-        
-        }
+def _empty_answer() -> dict:
+    return {
+        "answer": "Bu soruya cevap veremem çünkü ilgili bilgi tabanında bulunmuyor.",
+        "citations": [],
 
+    }
+
+
+def build_answer_prompt(query: str, context: str, mode: str = "qa") -> str:
     if mode == "howto":
         style = "Provide a clear step-by-step guide or checklist."
     else:
         style = "Provide a short factual answer."
 
-    prompt = f"""
+    return f"""
     You are an assistant for LangChain ecosystem questions.
     Answer strictly using the provided context.
 
@@ -39,10 +31,32 @@ def run_answer(query: str, context: str, citations: list, mode: str = "qa") -> d
     - If the answer is not in the context, reply with: "I don't know."
     """
 
-    resp = llm.invoke(prompt)
-    answer = resp.content.strip()
 
- 
+def run_answer(query: str, context: str, citations: list, mode: str = "qa", on_token=None) -> dict:
+    """
+    Unified Answer Agent.
+    mode = "qa"     → factual short answer
+    mode = "howto"  → step-by-step instructions
+    on_token: optional callback; if set, the answer is streamed token by token.
+    """
+    if not context.strip():
+        return _empty_answer()
+
+    llm = get_chat_model(ANSWER_MODEL)
+    answer = complete(llm, build_answer_prompt(query, context, mode), on_token, stage="llm.answer").strip()
+
+    return {"answer": answer, "citations": citations}
+
+
+async def arun_answer(query: str, context: str, citations: list, mode: str = "qa", on_token=None) -> dict:
+    """
+    Async Unified Answer Agent (llm.ainvoke / llm.astream with on_token).
+    """
+    if not context.strip():
+        return _empty_answer()
+
+    llm = get_chat_model(ANSWER_MODEL)
+    answer = (await acomplete(llm, build_answer_prompt(query, context, mode), on_token, stage="llm.answer")).strip()
 
     return {"answer": answer, "citations": citations}
 
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from tools.metrics import node_scope, add_breakdown
+
+
+# ===============================
+# Micro-batcher
+# ===============================
+class MicroBatcher:
+    """
+    Groups concurrent async requests into one call of a blocking batch function.
+
+    `batch_fn(items) -> results` receives every item collected within `window_ms`
+    (at most `max_batch`) and runs in a worker thread. While one batch runs, the
+    next one accumulates, so batch size grows with load.
+
+    batch_fn runs outside the callers' node_scope, so what it records (encode,
+    faiss_search, rerank seconds) is collected per batch and added to every
+    caller's node breakdown: each caller sees the wall time of the batch it waited on.
+    """
+
+    def __init__(self, name: str, batch_fn, max_batch: int = 32, window_ms: float = 5.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        """Must be called from the serving event loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Cancel the worker; callers still waiting in submit() get RuntimeError("batcher stopped")."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("batcher stopped"))
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        result, breakdown = await future
+        add_breakdown(breakdown)
+        return result
+
+    def _call(self, items):
+        with node_scope() as breakdown:
+            results = self.batch_fn(items)
+        return results, breakdown
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        try:
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # kuyruktan alınmış ama çalıştırılmamış istekler
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("batcher stopped"))
+            raise
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            started = time.perf_counter()
+            try:
+                results, breakdown = await asyncio.to_thread(self._call, items)
+            except asyncio.CancelledError:
+                # stop() sırasında işlenen batch'in çağıranları da beklemede kalmasın
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("batcher stopped"))
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.items += len(items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result((result, breakdown))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
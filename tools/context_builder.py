@@ -0,0 +1,94 @@
+import os
+import re
+from tools.metrics import timed
+
+# ===============================
+# Settings
+# ===============================
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CHARS_PER_TOKEN = 4            # kaba tahmin; tokenizer yüklemeye gerek yok
+NEAR_DUPLICATE_JACCARD = 0.8
+MAX_SPLITTER_OVERLAP = 300     # parsing.py CHUNK_OVERLAP=100, biraz pay bırak
+
+WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _shingles(text: str, n: int = 5) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _is_near_duplicate(shingles: set, kept: list) -> bool:
+    for other in kept:
+        inter = len(shingles & other)
+        if not inter:
+            continue
+        if inter / len(shingles | other) >= NEAR_DUPLICATE_JACCARD or inter / len(shingles) >= NEAR_DUPLICATE_JACCARD:
+            return True
+    return False
+
+
+def _merge_overlapping(left: str, right: str) -> str:
+    """Join two consecutive chunks, dropping the splitter overlap (suffix of left == prefix of right)."""
+    for size in range(min(len(left), len(right), MAX_SPLITTER_OVERLAP), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+# ===============================
+# Context Builder
+# ===============================
+@timed("context_build")
+def build_context(results: list, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Pack reranked chunks into a prompt context under a token budget.
+      1. highest score first
+      2. near-duplicate chunks (overlapping splits, repeated pages) are dropped
+      3. chunks are added while they fit the budget
+      4. consecutive chunks of the same page are merged without the splitter overlap
+    Returns (context, used_results); used_results are the chunks that made it in,
+    in score order, and serve as citations.
+    """
+    ranked = sorted(results, key=lambda r: r.get("score", 0.0), reverse=True)
+
+    used, kept_shingles, tokens = [], [], 0
+    for r in ranked:
+        content = r.get("content", "")
+        if not content.strip():
+            continue
+        shingles = _shingles(content)
+        if _is_near_duplicate(shingles, kept_shingles):
+            continue
+        cost = estimate_tokens(content)
+        if tokens + cost > token_budget:
+            continue
+        used.append(r)
+        kept_shingles.append(shingles)
+        tokens += cost
+
+    # Aynı sayfanın ardışık chunk'larını birleştir; gruplar en iyi skor sırasıyla kalır
+    groups = []  # [source, last_chunk_id, text, first_chunk_id]
+    for r in used:
+        source, chunk_id = r.get("source"), r.get("chunk_id")
+        for group in groups:
+            if source and chunk_id is not None and group[0] == source and group[1] is not None:
+                if chunk_id == group[1] + 1:
+                    group[2] = _merge_overlapping(group[2], r["content"])
+                    group[1] = chunk_id
+                    break
+                if chunk_id == group[3] - 1:
+                    group[2] = _merge_overlapping(r["content"], group[2])
+                    group[3] = chunk_id
+                    break
+        else:
+            groups.append([source, chunk_id, r["content"], chunk_id])
+
+    context = "\n\n".join(group[2] for group in groups)
+    return context, used
@@ -0,0 +1,157 @@
+"""
+Compact, memory-mapped docstore (replaces the giant docstore.json dict).
+
+Single-file layout, so a rebuild can swap it atomically with os.replace:
+
+    MAGIC (8 bytes)
+    records   : one UTF-8 JSON object per chunk, back to back
+    id table  : (global_chunk_id int64, offset int64, length int64, project int32) × n, sorted by id
+    projects  : JSON list of project names (the id table stores the index, -1 = none)
+    footer    : table offset int64, n int64, projects offset int64
+
+Opening only reads the footer and maps the file; a lookup is a binary search
+in the id table plus one json.loads of that record. Pages are shared between
+worker processes through the OS page cache. The project column lets the
+retriever build metadata filters without parsing any record.
+
+Convert an existing docstore.json (repo kökünden):
+    python -m tools.docstore data/docstore.json data/docstore.bin
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"DOCSTOR2"
+FOOTER = struct.Struct("<qqq")
+ENTRY_DTYPE = np.dtype([("id", "<i8"), ("offset", "<i8"), ("length", "<i8"), ("project", "<i4")])
+
+
+class Docstore:
+    """Read-only view over a docstore file: get(gid) → dict or None."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(
+                    f"{path} is not a binary docstore. "
+                    f"Convert it with: python -m tools.docstore <docstore.json> {path}"
+                )
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._mm) - FOOTER.size
+        table_offset, n, projects_offset = FOOTER.unpack_from(self._mm, end)
+        self._table = np.frombuffer(self._mm, dtype=ENTRY_DTYPE, count=n, offset=table_offset)
+        self.ids = self._table["id"]
+        self.projects = json.loads(self._mm[projects_offset:end])
+
+    def __len__(self):
+        return len(self._table)
+
+    def _find(self, gid: int):
+        pos = int(np.searchsorted(self.ids, gid))
+        if pos < len(self.ids) and self.ids[pos] == gid:
+            return pos
+        return None
+
+    def __contains__(self, gid) -> bool:
+        return self._find(int(gid)) is not None
+
+    def _record(self, pos: int) -> dict:
+        entry = self._table[pos]
+        start = int(entry["offset"])
+        return json.loads(self._mm[start:start + int(entry["length"])])
+
+    def get(self, gid, default=None):
+        pos = self._find(int(gid))
+        return default if pos is None else self._record(pos)
+
+    def ids_for_projects(self, projects) -> np.ndarray:
+        """Sorted global_chunk_ids whose `project` is one of `projects` (unknown names match nothing)."""
+        codes = [self.projects.index(p) for p in projects if p in self.projects]
+        return self.ids[np.isin(self._table["project"], codes)]
+
+    def items(self):
+        """(global_chunk_id, doc) for every chunk, in id order (streams; nothing is cached)."""
+        for pos in range(len(self._table)):
+            yield int(self.ids[pos]), self._record(pos)
+
+    def close(self):
+        # numpy view'ı bırakmadan mmap kapatılamaz
+        self._table = self.ids = None
+        self._mm.close()
+
+
+class DocstoreWriter:
+    """
+    Streams records to `path + ".tmp"` and, on close(), appends the sorted id table
+    and atomically replaces `path`. Duplicate ids keep the first record.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self._f = open(self.tmp_path, "wb")
+        self._f.write(MAGIC)
+        self._entries = []
+        self.ids = set()  # written global_chunk_ids
+        self._projects = {}  # project name -> code
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, gid, doc: dict) -> bool:
+        gid = int(gid)
+        if gid in self.ids:
+            return False
+        data = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        project = doc.get("project")
+        code = self._projects.setdefault(project, len(self._projects)) if project else -1
+        self._entries.append((gid, self._f.tell(), len(data), code))
+        self.ids.add(gid)
+        self._f.write(data)
+        return True
+
+    def close(self):
+        table = np.array(self._entries, dtype=ENTRY_DTYPE)
+        table.sort(order="id")
+        table_offset = self._f.tell()
+        self._f.write(table.tobytes())
+        projects_offset = self._f.tell()
+        self._f.write(json.dumps(list(self._projects), ensure_ascii=False).encode("utf-8"))
+        self._f.write(FOOTER.pack(table_offset, len(table), projects_offset))
+        self._f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def convert_json(json_path: str, out_path: str) -> int:
+    """Legacy docstore.json ({"gid": doc}) → binary docstore. Returns the record count."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        docstore = json.load(f)
+    with DocstoreWriter(out_path) as writer:
+        for gid, doc in docstore.items():
+            writer.add(gid, doc)
+    return len(writer)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m tools.docstore <docstore.json> <docstore.bin>")
+    count = convert_json(sys.argv[1], sys.argv[2])
+    print(f"[OK] {count} kayıt → {sys.argv[2]}")
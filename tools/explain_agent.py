@@ -1,37 +1,22 @@
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
-from tools.retriever import hybrid_search_with_rerank
+from tools.llm import complete, acomplete, get_chat_model
+from tools.retriever import hybrid_search_with_rerank, ahybrid_search_with_rerank
+from tools.context_builder import build_context
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+EXPLAIN_MODEL = "gemini-1.5-flash"
 
 # ===================================
 # Low-level function
 # ===================================
-def run_explain(query: str, code_snippet: str) -> dict:
-    """
-    Explain or debug a code snippet.
-    If it uses LangChain/LangGraph APIs, run retrieval to add context.
-    """
-    # --- Detect if snippet is LangChain-related ---
-    is_langchain = any(
+def _is_langchain(code_snippet: str) -> bool:
+    return any(
         kw in code_snippet.lower()
         for kw in ["langchain", "langgraph", "langsmith"]
     )
 
-    context = ""
-    citations = []
-    if is_langchain:
-        # retrieve docs for explanation
-        results = hybrid_search_with_rerank.invoke({"query": query})
-        context = "\n".join([r["content"] for r in results])
-        citations = results
 
-    # --- Prompt for explanation ---
-    prompt = f"""
+def build_explain_prompt(query: str, code_snippet: str, context: str) -> str:
+    return f"""
     You are an assistant that explains code to a junior developer.
 
     User Question: {query}
@@ -49,12 +34,48 @@ def run_explain(query: str, code_snippet: str) -> dict:
     - Keep the explanation short and clear.
     """
 
-    resp = llm.invoke(prompt)
-    explanation = resp.content.strip()
+
+def run_explain(query: str, code_snippet: str, context: str = None, citations: list = None, on_token=None) -> dict:
+    """
+    Explain or debug a code snippet.
+    If it uses LangChain/LangGraph APIs, run retrieval to add context
+    (unless the pipeline already retrieved it and passes context/citations).
+    on_token: optional callback; if set, the explanation is streamed token by token.
+    """
+    if context is None:
+        context, citations = "", []
+        # --- Detect if snippet is LangChain-related ---
+        if _is_langchain(code_snippet):
+            # retrieve docs for explanation
+            results = hybrid_search_with_rerank.invoke({"query": query})
+            context, citations = build_context(results)
+
+    llm = get_chat_model(EXPLAIN_MODEL)
+    explanation = complete(llm, build_explain_prompt(query, code_snippet, context), on_token, stage="llm.explain").strip()
+
+    return {
+        "answer": explanation,
+        "citations": citations or [],
+
+    }
+
+
+async def arun_explain(query: str, code_snippet: str, context: str = None, citations: list = None, on_token=None) -> dict:
+    """
+    Async run_explain (llm.ainvoke + async retrieval).
+    """
+    if context is None:
+        context, citations = "", []
+        if _is_langchain(code_snippet):
+            results = await ahybrid_search_with_rerank(query)
+            context, citations = build_context(results)
+
+    llm = get_chat_model(EXPLAIN_MODEL)
+    explanation = (await acomplete(llm, build_explain_prompt(query, code_snippet, context), on_token, stage="llm.explain")).strip()
 
     return {
         "answer": explanation,
-        "citations": citations,
+        "citations": citations or [],
 
     }
 
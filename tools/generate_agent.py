@@ -1,29 +1,15 @@
 # tools/generate_agent.py
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.tools import tool
+from tools.llm import complete, acomplete, get_chat_model
 from langsmith import traceable
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+GENERATE_MODEL = "gemini-2.0-flash"
 
 # ===================================
 # Low-level function
 # ===================================
-def run_generate(query: str, context: str, citations: list) -> dict:
-    """
-    Generate code based on user request and retrieved context.
-    """
-    if not context.strip():
-        return {
-            "code": "# Bilgi bulunamadı: İlgili context boş.",
-            "citations": [],
-        }
-
-    # --- Code generation prompt ---
-    prompt = f"""
+def build_generate_prompt(query: str, context: str) -> str:
+    return f"""
     You are a coding assistant. 
     Generate Python code that solves the user's request using only the provided context if possible. 
     If the answer cannot be found in the context, still try to generate reasonable code but clearly mark it as "⚠️ speculative".
@@ -36,10 +22,36 @@ def run_generate(query: str, context: str, citations: list) -> dict:
     Return only the code, no explanations.
     """
 
-    resp = llm.invoke(prompt)
-    code = resp.content.strip()
 
-   
+def run_generate(query: str, context: str, citations: list, on_token=None) -> dict:
+    """
+    Generate code based on user request and retrieved context.
+    on_token: optional callback; if set, the code is streamed token by token.
+    """
+    if not context.strip():
+        return {
+            "code": "# Bilgi bulunamadı: İlgili context boş.",
+            "citations": [],
+        }
+
+    llm = get_chat_model(GENERATE_MODEL)
+    code = complete(llm, build_generate_prompt(query, context), on_token, stage="llm.generate").strip()
+
+    return {"code": code, "citations": citations}
+
+
+async def arun_generate(query: str, context: str, citations: list, on_token=None) -> dict:
+    """
+    Async code generation (llm.ainvoke / llm.astream with on_token).
+    """
+    if not context.strip():
+        return {
+            "code": "# Bilgi bulunamadı: İlgili context boş.",
+            "citations": [],
+        }
+
+    llm = get_chat_model(GENERATE_MODEL)
+    code = (await acomplete(llm, build_generate_prompt(query, context), on_token, stage="llm.generate")).strip()
 
     return {"code": code, "citations": citations}
 
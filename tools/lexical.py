@@ -0,0 +1,121 @@
+import os
+import re
+import pickle
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from tools.docstore import Docstore
+
+# ===============================
+# Tokenizer (API-name aware)
+# ===============================
+# "StateGraph.add_conditional_edges" → the full dotted name, every part and
+# every snake_case piece, so exact API names and loose wording both match.
+TOKEN_RE = re.compile(r"[^\W\d]\w*(?:\.[^\W\d]\w*)*|\d+")
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for tok in TOKEN_RE.findall(text or ""):
+        tok = tok.lower()
+        tokens.append(tok)
+        if "." in tok:
+            parts = tok.split(".")
+            tokens.extend(parts)
+        else:
+            parts = [tok]
+        for part in parts:
+            if "_" in part.strip("_"):
+                tokens.extend(p for p in part.split("_") if p)
+    return tokens
+
+
+def doc_text(doc: dict) -> str:
+    return " ".join([doc.get("title") or "", doc.get("section") or "", doc.get("content") or ""])
+
+
+# ===============================
+# Lexical Index (BM25, inverted)
+# ===============================
+class LexicalIndex:
+    """
+    BM25 index over the docstore. Scores are computed with rank-bm25 at build time
+    and stored as per-term postings, so a query only touches the documents that
+    contain its terms instead of scanning the whole corpus.
+    """
+
+    def __init__(self, ids, postings):
+        self.ids = np.asarray(ids, dtype="int64")
+        self.postings = postings  # term -> (doc positions int32, bm25 weights float32)
+
+    @classmethod
+    def build(cls, items, k1: float = 1.5, b: float = 0.75):
+        """items: iterable of (global_chunk_id, text)."""
+        ids, corpus = [], []
+        for gid, text in items:
+            ids.append(int(gid))
+            corpus.append(tokenize(text) or [""])
+
+        postings = {}
+        if corpus:
+            bm25 = BM25Okapi(corpus, k1=k1, b=b)
+            for pos, freqs in enumerate(bm25.doc_freqs):
+                norm = k1 * (1 - b + b * bm25.doc_len[pos] / bm25.avgdl)
+                for term, tf in freqs.items():
+                    weight = bm25.idf[term] * tf * (k1 + 1) / (tf + norm)
+                    plist = postings.setdefault(term, ([], []))
+                    plist[0].append(pos)
+                    plist[1].append(weight)
+        postings = {
+            term: (np.asarray(p, dtype="int32"), np.asarray(w, dtype="float32"))
+            for term, (p, w) in postings.items()
+        }
+        return cls(ids, postings)
+
+    def mask_for(self, allowed_ids) -> np.ndarray:
+        """Boolean mask over index positions for a metadata filter (see search)."""
+        return np.isin(self.ids, allowed_ids)
+
+    def search(self, query: str, top_k: int = 20, mask: np.ndarray = None):
+        """
+        Returns [(global_chunk_id, bm25_score), ...] best first.
+        mask (from mask_for) limits the result to the allowed documents.
+        """
+        terms = set(tokenize(query))
+        if not terms or not len(self.ids):
+            return []
+        scores = np.zeros(len(self.ids), dtype="float32")
+        for term in terms:
+            plist = self.postings.get(term)
+            if plist is not None:
+                scores[plist[0]] += plist[1]
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if not len(hits):
+            return []
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(self.ids[i]), float(scores[i])) for i in hits]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump({"ids": self.ids, "postings": self.postings}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        return cls(data["ids"], data["postings"])
+
+
+def build_from_docstore(docstore_path: str, out_path: str) -> LexicalIndex:
+    """docstore.bin → persisted BM25 index (no embedding, cheap to rebuild)."""
+    docstore = Docstore(docstore_path)
+    lexical = LexicalIndex.build((gid, doc_text(doc)) for gid, doc in docstore.items())
+    tmp_path = out_path + ".tmp"
+    lexical.save(tmp_path)
+    os.replace(tmp_path, out_path)
+    return lexical
@@ -0,0 +1,120 @@
+import os
+import threading
+from typing import Callable, Optional
+from tools.metrics import timed, record_tokens, record_payload, usage_of
+
+# ===============================
+# Chat models (built on first use, shared per model name)
+# ===============================
+# langchain_google_genai import'u ve client kurulumu ilk çağrıya kadar ertelenir: modülleri
+# import etmek (worker / CLI başlangıcı) ağ istemcisi kurmaz, GOOGLE_API_KEY'e bakmaz.
+_chat_models = {}
+_structured_models = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(model: str):
+    """Process-wide ChatGoogleGenerativeAI for `model` (one instance per model name)."""
+    llm = _chat_models.get(model)
+    if llm is None:
+        with _models_lock:
+            llm = _chat_models.get(model)
+            if llm is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+
+                llm = _chat_models[model] = ChatGoogleGenerativeAI(
+                    model=model,
+                    google_api_key=os.environ["GOOGLE_API_KEY"]
+                )
+    return llm
+
+
+def get_structured_model(model: str, schema):
+    """get_chat_model(model).with_structured_output(schema, include_raw=True), built once per (model, schema)."""
+    key = (model, schema)
+    runnable = _structured_models.get(key)
+    if runnable is None:
+        llm = get_chat_model(model)
+        with _models_lock:
+            runnable = _structured_models.get(key)
+            if runnable is None:
+                # include_raw: token sayıları ham mesajda (bkz. structured)
+                runnable = _structured_models[key] = llm.with_structured_output(schema, include_raw=True)
+    return runnable
+
+
+# ===============================
+# Completion helpers (blocking or token-streaming)
+# ===============================
+# Her çağrı `stage` adıyla ölçülür: süre, prompt/completion token'ları, karakter sayıları
+def _record(stage: str, prompt: str, text: str, usage):
+    record_tokens(stage, *usage)
+    record_payload(stage, "request", len(prompt))
+    record_payload(stage, "response", len(text))
+
+
+def complete(llm, prompt: str, on_token: Optional[Callable[[str], None]] = None, stage: str = "llm") -> str:
+    """
+    llm.invoke(prompt).content, or — when on_token is given — llm.stream(prompt)
+    with every text chunk passed to on_token as it arrives.
+    """
+    with timed(stage):
+        if on_token is None:
+            message = llm.invoke(prompt)
+            _record(stage, prompt, message.content, usage_of(message))
+            return message.content
+        parts, prompt_tokens, completion_tokens = [], 0, 0
+        for chunk in llm.stream(prompt):
+            # usage_metadata stream'de (genelde son) chunk'larda gelir
+            p, c = usage_of(chunk)
+            prompt_tokens, completion_tokens = prompt_tokens + p, completion_tokens + c
+            if chunk.content:
+                parts.append(chunk.content)
+                on_token(chunk.content)
+    text = "".join(parts)
+    _record(stage, prompt, text, (prompt_tokens, completion_tokens))
+    return text
+
+
+async def acomplete(llm, prompt: str, on_token: Optional[Callable[[str], None]] = None, stage: str = "llm") -> str:
+    """Async complete (llm.ainvoke / llm.astream)."""
+    with timed(stage):
+        if on_token is None:
+            message = await llm.ainvoke(prompt)
+            _record(stage, prompt, message.content, usage_of(message))
+            return message.content
+        parts, prompt_tokens, completion_tokens = [], 0, 0
+        async for chunk in llm.astream(prompt):
+            p, c = usage_of(chunk)
+            prompt_tokens, completion_tokens = prompt_tokens + p, completion_tokens + c
+            if chunk.content:
+                parts.append(chunk.content)
+                on_token(chunk.content)
+    text = "".join(parts)
+    _record(stage, prompt, text, (prompt_tokens, completion_tokens))
+    return text
+
+
+# ===============================
+# Structured output helpers
+# ===============================
+# runnable = get_structured_model(...): include_raw=True, ham mesaj token sayıları için gerekli
+def _parsed(stage: str, prompt: str, out: dict):
+    _record(stage, prompt, getattr(out["raw"], "content", "") or "", usage_of(out["raw"]))
+    if out.get("parsing_error") is not None:
+        raise out["parsing_error"]
+    return out["parsed"]
+
+
+def structured(runnable, prompt: str, stage: str):
+    """Parsed result of a with_structured_output(..., include_raw=True) runnable, instrumented."""
+    with timed(stage):
+        out = runnable.invoke(prompt)
+    return _parsed(stage, prompt, out)
+
+
+async def astructured(runnable, prompt: str, stage: str):
+    """Async structured (runnable.ainvoke)."""
+    with timed(stage):
+        out = await runnable.ainvoke(prompt)
+    return _parsed(stage, prompt, out)
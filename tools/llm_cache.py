@@ -0,0 +1,141 @@
+import os
+import re
+import copy
+import time
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from tools.metrics import record_cache
+
+# ===============================
+# Settings
+# ===============================
+LLM_MEMO_ENABLED = os.getenv("LLM_MEMO", "1") == "1"
+LLM_MEMO_MAX_ENTRIES = int(os.getenv("LLM_MEMO_MAX_ENTRIES", "4096"))
+LLM_MEMO_TTL = float(os.getenv("LLM_MEMO_TTL", str(6 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+
+
+# ===============================
+# Memo store
+# ===============================
+class LLMMemo:
+    """Bounded LRU + TTL store for results of deterministic LLM prompts."""
+
+    def __init__(self, name: str, max_entries: int = LLM_MEMO_MAX_ENTRIES, ttl: float = LLM_MEMO_TTL):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (created, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns (found, value)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.time() - item[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                record_cache(f"llm_memo.{self.name}", True)
+                return True, copy.deepcopy(item[1])
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            record_cache(f"llm_memo.{self.name}", False)
+            return False, None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time(), copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_memos = {}
+
+
+def memo_stats() -> dict:
+    """Hit/miss counters of every memoized prompt, keyed by name."""
+    return {name: memo.stats() for name, memo in _memos.items()}
+
+
+def llm_memoize(name: str, model: str, template: str, normalize=("query",)):
+    """
+    Memoize a function whose result depends only on its arguments and one LLM prompt.
+    The key is (model, sha1(template), normalized `normalize` args, digest of the rest),
+    so editing the prompt template or switching models never serves stale results.
+    Works on sync and async functions; a sync/async pair with the same name and
+    signature shares one store. `wrapper.with_hit(...)` returns (result, memo_hit).
+    """
+    memo = _memos.setdefault(name, LLMMemo(name))
+    template_hash = hashlib.sha1(template.encode("utf-8")).hexdigest()
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            parts = []
+            for arg_name, value in bound.arguments.items():
+                if arg_name in normalize and isinstance(value, str):
+                    parts.append((arg_name, normalize_text(value)))
+                else:
+                    parts.append((arg_name, _digest(value)))
+            return (model, template_hash, tuple(parts))
+
+        if inspect.iscoroutinefunction(func):
+            async def with_hit(*args, **kwargs):
+                if not LLM_MEMO_ENABLED:
+                    return await func(*args, **kwargs), False
+                key = make_key(args, kwargs)
+                found, value = memo.get(key)
+                if found:
+                    return value, True
+                value = await func(*args, **kwargs)
+                memo.set(key, value)
+                return value, False
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return (await with_hit(*args, **kwargs))[0]
+        else:
+            def with_hit(*args, **kwargs):
+                if not LLM_MEMO_ENABLED:
+                    return func(*args, **kwargs), False
+                key = make_key(args, kwargs)
+                found, value = memo.get(key)
+                if found:
+                    return value, True
+                value = func(*args, **kwargs)
+                memo.set(key, value)
+                return value, False
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return with_hit(*args, **kwargs)[0]
+
+        wrapper.memo = memo
+        wrapper.with_hit = with_hit
+        return wrapper
+
+    return decorator
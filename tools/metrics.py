@@ -0,0 +1,284 @@
+"""
+Lightweight in-process instrumentation (works without LangSmith or a Prometheus client).
+
+Instrumented calls record into one process-wide registry, exported in the
+Prometheus text format (server: GET /metrics):
+
+    rag_node_seconds{node}                    histogram  wall time of every graph node
+    rag_stage_seconds{stage}                  histogram  LLM / encode / FAISS / BM25 / rerank calls
+    rag_llm_tokens_total{stage,kind}          counter    prompt / completion tokens (usage_metadata)
+    rag_cache_requests_total{cache,result}    counter    hit / miss of the LLM memo and semantic cache
+    rag_payload_chars_total{stage,direction}  counter    characters sent to / received from LLMs and rerank
+
+and into the breakdown of the node currently running (node_scope), which
+main_node puts into state["metrics"][<node>]. A record is a perf_counter
+delta plus a few dict updates under one lock; METRICS=0 turns it all off.
+"""
+import os
+import time
+import inspect
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ===============================
+# Settings
+# ===============================
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    "rag_node_seconds": ("histogram", "Wall time of graph nodes."),
+    "rag_stage_seconds": ("histogram", "Wall time of LLM, encode, search and rerank calls."),
+    "rag_llm_tokens_total": ("counter", "LLM tokens by stage and kind (prompt / completion)."),
+    "rag_cache_requests_total": ("counter", "Cache lookups by cache and result (hit / miss)."),
+    "rag_payload_chars_total": ("counter", "Characters sent to (request) / received from (response) a stage."),
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # son kova: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+# ===============================
+# Registry
+# ===============================
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> float
+        self._histograms = {}  # (name, labels) -> _Histogram
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """{"counters": {name: [(labels, value)]}, "histograms": {name: [(labels, count, sum)]}}"""
+        with self._lock:
+            counters, histograms = {}, {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append((dict(labels), value))
+            for (name, labels), hist in self._histograms.items():
+                histograms.setdefault(name, []).append((dict(labels), hist.count, hist.sum))
+            return {"counters": counters, "histograms": histograms}
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(h.buckets), h.sum, h.count) for key, h in self._histograms.items())
+
+        lines, described = [], set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), buckets, total, count in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def render_prometheus() -> str:
+    return registry.render()
+
+
+# ===============================
+# Per-node breakdown
+# ===============================
+# Breakdown dict of the running node; asyncio.to_thread and copy_context().run
+# carry it into worker threads, so their records land in the same dict.
+_scope = ContextVar("metrics_scope", default=None)
+_scope_lock = threading.Lock()
+
+
+def _new_breakdown() -> dict:
+    return {"seconds": {}, "tokens": {"prompt": 0, "completion": 0}, "chars": {}, "cache": {}}
+
+
+@contextmanager
+def node_scope():
+    """
+    Collect what the calls inside record into a fresh breakdown:
+    {"seconds": {stage: s}, "tokens": {"prompt", "completion"}, "chars": {stage: n}, "cache": {name: "hit"|"miss"}}
+    """
+    breakdown = _new_breakdown()
+    token = _scope.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _scope.reset(token)
+
+
+def compact(breakdown: dict) -> dict:
+    """Breakdown without empty sections, seconds rounded (what goes into the graph state)."""
+    out = {}
+    if breakdown["seconds"]:
+        out["seconds"] = {k: round(v, 4) for k, v in breakdown["seconds"].items()}
+    if any(breakdown["tokens"].values()):
+        out["tokens"] = dict(breakdown["tokens"])
+    if breakdown["chars"]:
+        out["chars"] = dict(breakdown["chars"])
+    if breakdown["cache"]:
+        out["cache"] = dict(breakdown["cache"])
+    return out
+
+
+def add_breakdown(breakdown: dict):
+    """
+    Add a breakdown recorded elsewhere (a micro-batch run on the batcher's thread)
+    to the running node's. The registry already has those records; only the
+    per-node view is updated.
+    """
+    current = _scope.get()
+    if current is None or not breakdown:
+        return
+    with _scope_lock:
+        for section in ("seconds", "tokens", "chars"):
+            part = current[section]
+            for key, value in breakdown[section].items():
+                part[key] = part.get(key, 0) + value
+        current["cache"].update(breakdown["cache"])
+
+
+def _add(section: str, key: str, value):
+    breakdown = _scope.get()
+    if breakdown is not None:
+        with _scope_lock:
+            part = breakdown[section]
+            part[key] = part.get(key, 0) + value
+
+
+# ===============================
+# Recording API
+# ===============================
+def record_node(node: str, seconds: float):
+    if METRICS_ENABLED:
+        registry.observe("rag_node_seconds", seconds, node=node)
+
+
+def record_seconds(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        registry.observe("rag_stage_seconds", seconds, stage=stage)
+        _add("seconds", stage, seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    if METRICS_ENABLED:
+        result = "hit" if hit else "miss"
+        registry.inc("rag_cache_requests_total", cache=cache, result=result)
+        breakdown = _scope.get()
+        if breakdown is not None:
+            breakdown["cache"][cache] = result
+
+
+def record_payload(stage: str, direction: str, chars: int):
+    if METRICS_ENABLED and chars:
+        registry.inc("rag_payload_chars_total", chars, stage=stage, direction=direction)
+        if direction == "request":
+            _add("chars", stage, chars)
+
+
+def record_tokens(stage: str, prompt_tokens: int, completion_tokens: int):
+    if not METRICS_ENABLED:
+        return
+    for kind, n in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if n:
+            registry.inc("rag_llm_tokens_total", n, stage=stage, kind=kind)
+            _add("tokens", kind, n)
+
+
+def usage_of(message) -> tuple:
+    """(input_tokens, output_tokens) from a LangChain message's usage_metadata, (0, 0) if absent."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0) or 0, usage.get("output_tokens", 0) or 0
+
+
+class timed:
+    """
+    Wall time of `stage` → rag_stage_seconds and the node breakdown.
+    Context manager (`with timed("encode"):`) or decorator for sync and async functions.
+    """
+
+    __slots__ = ("stage", "_started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_seconds(self.stage, time.perf_counter() - self._started)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with timed(stage):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with timed(stage):
+                    return func(*args, **kwargs)
+        return wrapper
@@ -1,7 +1,13 @@
 from typing_extensions import Literal
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
+from tools.llm_cache import llm_memoize
+from tools.llm import structured, astructured, get_structured_model
 import os
+import re
+import asyncio
+import json
+import time
+import threading
 import dotenv
 
 dotenv.load_dotenv()
@@ -9,10 +15,7 @@ dotenv.load_dotenv()
 # ===============================
 # LLM Setup
 # ===============================
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+PLANNER_MODEL = "gemini-1.5-flash"
 
 # ===============================
 # Structured Output Schema
@@ -25,18 +28,19 @@ class Plan(BaseModel):
         ..., description="Execution path. Use 'none' if no tool should be used."
     )
 
-# LLM augmented with structured output
-router = llm.with_structured_output(Plan)
+class PlanWithQuery(Plan):
+    search_query: str = Field(
+        ..., description="Concise English search query (5-15 words) for the documentation vector database. Empty if tool='none'."
+    )
+
+
+# "separate" → Plan + ayrı optimize_query çağrısı, "combined" → tek çağrıda tool/path/search_query
+PLANNER_MODE = os.getenv("PLANNER_MODE", "separate")
 
 # ===============================
 # Planner Function
 # ===============================
-def plan_query(query: str) -> dict:
-    """
-    LLM-based planner that decides which tool & path to use for a query.
-    """
-    decision = router.invoke(
-    f"""
+PLANNER_PROMPT = """
     You are a routing assistant for the LangChain ecosystem (LangChain, LangGraph, LangSmith). 
     Your ONLY task is to select the correct tool and execution path.
 
@@ -69,6 +73,292 @@ def plan_query(query: str) -> dict:
 
     User query: {query}
     """
+
+SEARCH_QUERY_RULES = """
+    Search Query:
+    Also rewrite the user query into search_query, a concise technical search query that
+    will retrieve the most relevant chunks from the LangChain / LangGraph / LangSmith docs.
+    - Focus only on concepts, functions, classes, and usage details from these docs.
+    - Remove irrelevant words, personal pronouns, or conversational style.
+    - Always write it in **English**, 5–15 words, using the documentation vocabulary.
+    - Leave it empty when tool="none".
+
+"""
+COMBINED_PLANNER_PROMPT = PLANNER_PROMPT.replace("    User query: {query}", SEARCH_QUERY_RULES + "    User query: {query}")
+
+
+@llm_memoize("plan_query", model=PLANNER_MODEL, template=PLANNER_PROMPT)
+def plan_query_separate(query: str) -> dict:
+    """
+    LLM-based planner that decides which tool & path to use for a query.
+    """
+    decision = structured(
+        get_structured_model(PLANNER_MODEL, Plan), PLANNER_PROMPT.format(query=query), "llm.planner"
+    )
+
+    return {"tool": decision.tool, "path": decision.path}
+
+
+@llm_memoize("plan_query_combined", model=PLANNER_MODEL, template=COMBINED_PLANNER_PROMPT)
+def plan_query_combined(query: str) -> dict:
+    """
+    Planner + query optimizer in one structured call: tool, path and search_query.
+    """
+    decision = structured(
+        get_structured_model(PLANNER_MODEL, PlanWithQuery), COMBINED_PLANNER_PROMPT.format(query=query), "llm.planner"
+    )
+
+    return {"tool": decision.tool, "path": decision.path, "search_query": decision.search_query.strip()}
+
+
+# ===============================
+# Fast-path Router (rules → embedding classifier → LLM)
+# ===============================
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.8"))
+ROUTER_RULES_ENABLED = os.getenv("ROUTER_RULES", "1") == "1"
+# LLM kararları buraya JSONL olarak loglanır; embedding sınıflandırıcı da bu logdan eğitilir
+PLANNER_LOG_PATH = os.getenv("PLANNER_LOG_PATH")
+ROUTER_CLASSIFIER_ENABLED = os.getenv("ROUTER_CLASSIFIER", "0") == "1"
+
+DOMAIN_RE = re.compile(
+    r"lang(chain|graph|smith)|\blcel\b|stategraph|runnable|retriever|vector ?store|embedding|"
+    r"\b(react|tool[- ]calling|openai[- ]functions|sql|csv|pandas|multi[- ]?agent|langgraph) agents?\b|"
+    r"agent ?executor|create_\w*(agent|chain)\b|\b(llm|retrieval|qa|sequential|stuff|map[- ]reduce|conversational) ?chain\b|"
+    r"prompt ?template|tool call|checkpointer|\brag\b",
+    re.IGNORECASE,
 )
-    
-    return {"tool": decision.tool, "path": decision.path}
\ No newline at end of file
+CODE_BLOCK_RE = re.compile(r"```|^\s*(from \S+ import|import \S+|def \w+\(|class \w+[(:])", re.MULTILINE)
+GENERATE_RE = re.compile(
+    r"\bkod(u|unu)? (ver|yaz|üret|oluştur)|örnek kod|\b(give|write|generate|show) (me )?(the |some |a )?(python )?code\b|"
+    r"\bcode (for|that|to)\b|\bsnippet\b",
+    re.IGNORECASE,
+)
+EXPLAIN_RE = re.compile(
+    r"bu kod|kod ne yapıyor|neden (hata|çalışmıyor)|what does this (code|snippet)|why does this|\bdebug\b|\btraceback\b",
+    re.IGNORECASE,
+)
+HOWTO_RE = re.compile(
+    r"\bnasıl\b|adım adım|\bhow (do|to|can|should|would)\b|step[- ]by[- ]step",
+    re.IGNORECASE,
+)
+FACTUAL_RE = re.compile(
+    r"\bnedir\b|ne demek|ne işe yarar|\bfark(ı|ları)?\b|\bwhat (is|are)\b|\bdifference between\b|\bwhy\b|\bneden\b",
+    re.IGNORECASE,
+)
+
+
+def rule_route(query: str):
+    """
+    Keyword/regex version of the routing rules in PLANNER_PROMPT.
+    Returns (decision, confidence) or (None, 0.0) when no rule applies.
+    Every rule needs a DOMAIN_RE match; out-of-domain detection is left to the LLM.
+    FACTUAL stays below the default threshold (only a lowered threshold uses it).
+    """
+    if not DOMAIN_RE.search(query):
+        return None, 0.0
+
+    if CODE_BLOCK_RE.search(query):
+        if GENERATE_RE.search(query) and not EXPLAIN_RE.search(query):
+            return {"tool": "generate", "path": "fast"}, 0.85
+        return {"tool": "explain", "path": "slow"}, 0.95
+
+    if GENERATE_RE.search(query):
+        return {"tool": "generate", "path": "fast"}, 0.9
+    if EXPLAIN_RE.search(query):
+        return {"tool": "explain", "path": "slow"}, 0.85
+    if HOWTO_RE.search(query):
+        return {"tool": "answer", "path": "slow"}, 0.85
+    if FACTUAL_RE.search(query):
+        return {"tool": "answer", "path": "fast"}, 0.75
+    return None, 0.0
+
+
+class EmbeddingRouter:
+    """
+    Tiny kNN classifier over logged planner decisions (PLANNER_LOG_PATH),
+    using the retriever's bge-m3 encoder. Confidence is the similarity-weighted
+    vote share of the winning (tool, path) among the k nearest logged queries.
+    """
+
+    def __init__(self, log_path: str, k: int = 5, min_similarity: float = 0.75):
+        self.log_path = log_path
+        self.k = k
+        self.min_similarity = min_similarity
+        self._labels = None
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _train(self):
+        from tools.retriever import get_retriever
+
+        queries, labels = [], []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    queries.append(row["query"])
+                    labels.append((row["tool"], row["path"]))
+        self._labels = labels
+        self._matrix = get_retriever().encode(queries) if queries else None
+
+    def predict(self, query: str):
+        from tools.retriever import get_retriever
+
+        with self._lock:
+            if self._labels is None:
+                self._train()
+        if self._matrix is None:
+            return None, 0.0
+
+        sims = self._matrix @ get_retriever().encode([query])[0]
+        top = sims.argsort()[::-1][:self.k]
+        if sims[top[0]] < self.min_similarity:
+            return None, 0.0
+        votes = {}
+        for i in top:
+            votes[self._labels[i]] = votes.get(self._labels[i], 0.0) + max(float(sims[i]), 0.0)
+        (tool, path), weight = max(votes.items(), key=lambda x: x[1])
+        return {"tool": tool, "path": path}, weight / sum(votes.values())
+
+    def reset(self):
+        """Retrain on next predict (e.g. after more decisions were logged)."""
+        with self._lock:
+            self._labels = None
+            self._matrix = None
+
+
+_embedding_router = EmbeddingRouter(PLANNER_LOG_PATH) if (ROUTER_CLASSIFIER_ENABLED and PLANNER_LOG_PATH) else None
+
+# memo: LLM planner'ın llm_memoize'dan dönen kararları (LLM çağrısı yapılmadı)
+ROUTER_STATS = {tier: {"count": 0, "seconds": 0.0} for tier in ("rules", "classifier", "memo", "llm")}
+_stats_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def _record(tier: str, started: float):
+    with _stats_lock:
+        ROUTER_STATS[tier]["count"] += 1
+        ROUTER_STATS[tier]["seconds"] += time.perf_counter() - started
+
+
+def router_stats() -> dict:
+    """How often each routing tier decided and the total time spent in it."""
+    with _stats_lock:
+        return {tier: dict(v) for tier, v in ROUTER_STATS.items()}
+
+
+def _log_decision(query: str, decision: dict):
+    if not PLANNER_LOG_PATH:
+        return
+    line = json.dumps({"query": query, "tool": decision["tool"], "path": decision["path"]}, ensure_ascii=False)
+    # Ayrı kilit: dosya yazımı router_stats() / _record'u bekletmesin
+    with _log_lock:
+        with open(PLANNER_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@llm_memoize("plan_query", model=PLANNER_MODEL, template=PLANNER_PROMPT)
+async def aplan_query_separate(query: str) -> dict:
+    decision = await astructured(
+        get_structured_model(PLANNER_MODEL, Plan), PLANNER_PROMPT.format(query=query), "llm.planner"
+    )
+
+    return {"tool": decision.tool, "path": decision.path}
+
+
+@llm_memoize("plan_query_combined", model=PLANNER_MODEL, template=COMBINED_PLANNER_PROMPT)
+async def aplan_query_combined(query: str) -> dict:
+    decision = await astructured(
+        get_structured_model(PLANNER_MODEL, PlanWithQuery), COMBINED_PLANNER_PROMPT.format(query=query), "llm.planner"
+    )
+
+    return {"tool": decision.tool, "path": decision.path, "search_query": decision.search_query.strip()}
+
+
+def _local_route(query: str):
+    """Rules, then the optional embedding classifier. Returns a decision or None."""
+    started = time.perf_counter()
+    if ROUTER_RULES_ENABLED:
+        decision, confidence = rule_route(query)
+        if decision and confidence >= ROUTER_CONFIDENCE_THRESHOLD:
+            _record("rules", started)
+            return decision
+
+    if _embedding_router is not None:
+        started = time.perf_counter()
+        decision, confidence = _embedding_router.predict(query)
+        if decision and confidence >= ROUTER_CONFIDENCE_THRESHOLD:
+            _record("classifier", started)
+            return decision
+    return None
+
+
+def plan_query(query: str) -> dict:
+    """
+    Decide which tool & path to use for a query.
+    Local tiers (rules, optional embedding classifier) answer when they are
+    confident enough; otherwise the LLM planner decides (PLANNER_MODE selects
+    separate/combined) and its decision is logged for the classifier.
+    """
+    decision = _local_route(query)
+    if decision:
+        return decision
+
+    started = time.perf_counter()
+    planner = plan_query_combined if PLANNER_MODE == "combined" else plan_query_separate
+    decision, memo_hit = planner.with_hit(query)
+    if memo_hit:
+        _record("memo", started)
+        return decision
+    _record("llm", started)
+    _log_decision(query, decision)
+    return decision
+
+
+async def aplan_query(query: str) -> dict:
+    """
+    Async plan_query: local tiers run in a worker thread (the classifier encodes),
+    the LLM planner is awaited.
+    """
+    if _embedding_router is not None:
+        decision = await asyncio.to_thread(_local_route, query)
+    else:
+        decision = _local_route(query)
+    if decision:
+        return decision
+
+    started = time.perf_counter()
+    planner = aplan_query_combined if PLANNER_MODE == "combined" else aplan_query_separate
+    decision, memo_hit = await planner.with_hit(query)
+    if memo_hit:
+        _record("memo", started)
+        return decision
+    _record("llm", started)
+    _log_decision(query, decision)
+    return decision
+
+
+# ===============================
+# Project scope (metadata pre-filter for retrieval)
+# ===============================
+# Sorgu tek bir ürünü adıyla anıyorsa arama o ürünün dokümanlarıyla sınırlanır
+PROJECT_SCOPE_ENABLED = os.getenv("PLANNER_PROJECT_SCOPE", "0") == "1"
+PROJECT_PATTERNS = [
+    (re.compile(r"\blanggraph\b", re.IGNORECASE), ["langgraph", "langgraph-platform"]),
+    (re.compile(r"\blangsmith\b", re.IGNORECASE), ["langsmith"]),
+]
+
+
+def infer_projects(query: str) -> list:
+    """
+    Projects to pre-filter retrieval by, or [] (search everything). Only a query
+    that names exactly one product is scoped; LangChain is never used as a scope
+    because its concepts are spread across every project's docs.
+    """
+    if not PROJECT_SCOPE_ENABLED:
+        return []
+    matches = [projects for pattern, projects in PROJECT_PATTERNS if pattern.search(query)]
+    return matches[0] if len(matches) == 1 else []
@@ -1,29 +1,32 @@
-import faiss
 import numpy as np
-import json
 import os
-from sentence_transformers import SentenceTransformer
-import cohere
+import asyncio
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import dotenv
 from langchain_core.tools import tool
 from langsmith import traceable
-from langchain_google_genai import ChatGoogleGenerativeAI
+from tools.lexical import LexicalIndex
+from tools.llm_cache import llm_memoize
+from tools.batching import MicroBatcher
+from tools.docstore import Docstore
+from tools.llm import complete, acomplete, get_chat_model
+from tools.metrics import timed, record_payload
+
+# faiss, sentence-transformers (torch) ve cohere kullanıldıkları yerde import edilir:
+# bu modülü import etmek hızlı kalsın, ağır yükleme ilk aramada / warmup()'ta olsun.
 
 dotenv.load_dotenv()
 
 # ===============================
 # LLM for Query Optimization
 # ===============================
-llm_opt = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+OPTIMIZER_MODEL = "gemini-1.5-flash"
 
-def optimize_query(query: str) -> str:
-    """
-    Use LLM to rewrite/optimize the query for better retrieval.
-    """
-    prompt = f"""
+OPTIMIZE_QUERY_PROMPT = """
     You are a query optimization assistant.
 
     We have a local vector database built from documentation of:
@@ -45,92 +48,597 @@ def optimize_query(query: str) -> str:
 
     Optimized query:
     """
-    resp = llm_opt.invoke(prompt)
-    print("🔍 Optimized Query:", resp.content.strip())
-    return resp.content.strip()
+
+@llm_memoize("optimize_query", model=OPTIMIZER_MODEL, template=OPTIMIZE_QUERY_PROMPT)
+def optimize_query(query: str) -> str:
+    """
+    Use LLM to rewrite/optimize the query for better retrieval.
+    """
+    optimized = complete(get_chat_model(OPTIMIZER_MODEL), OPTIMIZE_QUERY_PROMPT.format(query=query),
+                         stage="llm.optimize_query").strip()
+    print("🔍 Optimized Query:", optimized)
+    return optimized
+
+@llm_memoize("optimize_query", model=OPTIMIZER_MODEL, template=OPTIMIZE_QUERY_PROMPT)
+async def aoptimize_query(query: str) -> str:
+    """
+    Async optimize_query (shares its memo).
+    """
+    optimized = (await acomplete(get_chat_model(OPTIMIZER_MODEL), OPTIMIZE_QUERY_PROMPT.format(query=query),
+                                 stage="llm.optimize_query")).strip()
+    print("🔍 Optimized Query:", optimized)
+    return optimized
+
+
+# ===============================
+# Retriever (model + index + docstore kept in memory)
+# ===============================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "..", "data")
+
+FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
+DOCSTORE_PATH = os.path.join(DATA_DIR, "docstore.bin")
+LEXICAL_INDEX_PATH = os.path.join(DATA_DIR, "bm25.pkl")
+EMBED_MODEL_NAME = "BAAI/bge-m3"
+
+# Hybrid fusion: "rrf" (reciprocal-rank) or "weighted" (max-normalised score mix)
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.3"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Over-fetch: dense/BM25 each fetch top_k × SEARCH_OVERFETCH before fusion; the
+# rerank tool asks hybrid search for top_k × RERANK_OVERFETCH candidates.
+# Read at call time, so the evaluation harness can vary them per run.
+SEARCH_OVERFETCH = float(os.getenv("SEARCH_OVERFETCH", "2"))
+RERANK_OVERFETCH = float(os.getenv("RERANK_OVERFETCH", "2"))
+
+# Lexical search runs here while the dense search runs on the caller's thread
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+
+def _fetch_k(top_k: int, factor: float) -> int:
+    return max(top_k, int(round(top_k * factor)))
+
+
+def _normalize(scored):
+    """[(gid, score)] → {gid: score / max_score}"""
+    scores = dict(scored)
+    if scores:
+        max_score = max(scores.values())
+        if max_score > 0:
+            scores = {k: v / max_score for k, v in scores.items()}
+    return scores
+
+
+def fuse_rankings(dense, lexical, method: str = HYBRID_FUSION,
+                  lexical_weight: float = HYBRID_LEXICAL_WEIGHT, rrf_k: int = RRF_K):
+    """
+    Merge dense and lexical [(gid, score)] lists (best first) into one ranking.
+    Returns [(gid, fused_score)] sorted desc, scores scaled to max 1.0.
+    """
+    fused = {}
+    if method == "weighted":
+        for weight, scores in ((1 - lexical_weight, _normalize(dense)), (lexical_weight, _normalize(lexical))):
+            for gid, score in scores.items():
+                fused[gid] = fused.get(gid, 0.0) + weight * score
+    else:
+        for ranking in (dense, lexical):
+            for rank, (gid, _) in enumerate(ranking):
+                fused[gid] = fused.get(gid, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(_normalize(fused.items()).items(), key=lambda x: x[1], reverse=True)
+
+
+def _project_key(projects) -> tuple:
+    return tuple(sorted(set(projects))) if projects else ()
+
+
+class _Filter:
+    """Pre-filter for one project set: FAISS SearchParameters + BM25 position mask."""
+
+    def __init__(self, ids, params, lexical_mask):
+        self.ids = ids
+        self.params = params
+        self.lexical_mask = lexical_mask
+
+    @property
+    def empty(self) -> bool:
+        return not len(self.ids)
+
+
+class _IndexState:
+    """Immutable snapshot of the loaded index + docstore (swapped as a whole on reload)."""
+
+    def __init__(self, index, docstore, lexical=None, version: str = ""):
+        # FAISS label'ları doğrudan global_chunk_id (IndexIDMap2); satır sırasına dayanan eski format yok
+        if not hasattr(index, "id_map"):
+            raise ValueError("FAISS index is not id-mapped (legacy format). Rebuild it: python -m scraper.build_index")
+        self.index = index
+        self.docstore = docstore
+        self.lexical = lexical
+        self.version = version
+        self._filters = {}  # project key -> _Filter
+
+    def filter(self, projects):
+        """_Filter for a project set, or None when unscoped. Built once per set and snapshot."""
+        key = _project_key(projects)
+        if not key:
+            return None
+        flt = self._filters.get(key)
+        if flt is None:
+            from tools.vector_index import filter_params
+
+            ids = self.docstore.ids_for_projects(key)
+            params = filter_params(self.index, ids) if len(ids) else None
+            mask = self.lexical.mask_for(ids) if self.lexical is not None else None
+            flt = self._filters[key] = _Filter(ids, params, mask)
+        return flt
+
+
+class Retriever:
+    """
+    Long-lived retriever: loads the SentenceTransformer, FAISS index and docstore
+    once and serves every query from memory. Safe to share across threads.
+    """
+
+    def __init__(self, index_path: str = FAISS_INDEX_PATH, docstore_path: str = DOCSTORE_PATH,
+                 model_name: str = EMBED_MODEL_NAME, lexical_path: str = LEXICAL_INDEX_PATH):
+        self.index_path = index_path
+        self.docstore_path = docstore_path
+        self.lexical_path = lexical_path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._model = None
+        self._state = None
+        self.dense_batcher = None  # MicroBatcher, set by start_batching() in the server
+
+    def _load_model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def _files_version(self) -> str:
+        """Changes whenever the index or docstore file on disk is replaced."""
+        parts = []
+        for path in (self.index_path, self.docstore_path):
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        return "-".join(parts)
+
+    def _load_state(self) -> _IndexState:
+        import faiss
+        from tools.vector_index import set_search_params
+
+        version = self._files_version()
+        docstore = Docstore(self.docstore_path)  # mmap: sadece footer okunur
+        index = faiss.read_index(self.index_path)
+        set_search_params(index)  # FAISS_NPROBE / FAISS_EF_SEARCH
+        lexical = None
+        if os.path.exists(self.lexical_path):
+            lexical = LexicalIndex.load(self.lexical_path)
+        else:
+            print(f"⚠️ BM25 index bulunamadı ({self.lexical_path}), hybrid arama sadece FAISS kullanacak.")
+        return _IndexState(index, docstore, lexical, version)
+
+    def _ensure_loaded(self):
+        if self._state is None or self._model is None:
+            with self._lock:
+                self._load_model()
+                if self._state is None:
+                    self._state = self._load_state()
+        return self._model, self._state
+
+    def warmup(self):
+        """Load everything and run one dummy encode so the first real query is not slow."""
+        model, _ = self._ensure_loaded()
+        model.encode(["warmup"], convert_to_numpy=True, normalize_embeddings=True)
+
+    def reload(self):
+        """Re-read index + docstore from disk (e.g. after a rebuild). The model is kept."""
+        state = self._load_state()
+        with self._lock:
+            self._load_model()
+            self._state = state
+
+    @property
+    def index_version(self) -> str:
+        """Version of the currently loaded index (used to invalidate answer caches)."""
+        _, state = self._ensure_loaded()
+        return state.version
+
+    def encode(self, texts):
+        model, _ = self._ensure_loaded()
+        with timed("encode"):
+            return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype("float32")
+
+    def _dense(self, state: _IndexState, query: str, top_k: int, flt: _Filter = None):
+        if flt is not None and flt.empty:
+            return []
+        q_emb = self.encode([query])
+        with timed("faiss_search"):
+            D, I = state.index.search(q_emb, k=top_k, params=flt.params if flt else None)
+        return [(int(i), float(D[0][rank])) for rank, i in enumerate(I[0]) if i != -1]
+
+    def dense_search_batch(self, items):
+        """
+        items: [(query, top_k, projects), ...] → one model.encode for all of them and
+        one index.search per distinct project filter.
+        Returns [[(gid, score), ...], ...] in the same order.
+        """
+        _, state = self._ensure_loaded()
+        q_emb = self.encode([item[0] for item in items])
+        groups = {}
+        for row, (_, _, projects) in enumerate(items):
+            groups.setdefault(_project_key(projects), []).append(row)
+
+        results = [[] for _ in items]
+        for key, rows in groups.items():
+            flt = state.filter(key)
+            if flt is not None and flt.empty:
+                continue
+            with timed("faiss_search"):
+                D, I = state.index.search(q_emb[rows], k=max(items[r][1] for r in rows),
+                                          params=flt.params if flt else None)
+            for j, row in enumerate(rows):
+                k = items[row][1]
+                results[row] = [(int(i), float(D[j][rank])) for rank, i in enumerate(I[j][:k]) if i != -1]
+        return results
+
+    def _lexical(self, state: _IndexState, query: str, top_k: int, flt: _Filter = None):
+        if state.lexical is None or (flt is not None and flt.empty):
+            return []
+        with timed("bm25_search"):
+            return state.lexical.search(query, top_k=top_k, mask=flt.lexical_mask if flt else None)
+
+    def _to_results(self, state: _IndexState, ranked):
+        results = []
+        for gid, score in ranked:
+            doc = state.docstore.get(gid)
+            if doc is None:
+                # index ve docstore güncelleme sırasında kısa süre ayrışabilir
+                continue
+            results.append({
+                "global_chunk_id": gid,
+                "score": round(score, 4),
+                "title": doc.get("title", ""),
+                "source": doc.get("source", ""),
+                "content": doc.get("content", ""),
+                "section": doc.get("section", ""),
+                "chunk_id": doc.get("chunk_id"),
+            })
+        return results
+
+    def search(self, query: str, top_k: int = 20, projects=None):
+        """
+        Semantic retrieval (FAISS only), optionally limited to `projects`.
+        """
+        _, state = self._ensure_loaded()
+        dense = self._dense(state, query, _fetch_k(top_k, SEARCH_OVERFETCH), state.filter(projects))
+        faiss_scores = _normalize(dense)
+        ranked = sorted(faiss_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return self._to_results(state, ranked)
+
+    def lexical_search(self, query: str, top_k: int = 20, projects=None):
+        """
+        Lexical retrieval (BM25 only), optionally limited to `projects`.
+        """
+        _, state = self._ensure_loaded()
+        lexical = self._lexical(state, query, top_k, state.filter(projects))
+        ranked = sorted(_normalize(lexical).items(), key=lambda x: x[1], reverse=True)
+        return self._to_results(state, ranked)
+
+    def hybrid_search(self, query: str, top_k: int = 20, lexical_query: str = None, projects=None):
+        """
+        Dense (FAISS) + lexical (BM25) retrieval run in parallel and fused.
+        lexical_query lets BM25 see the raw user text (exact API names) while
+        FAISS gets the rewritten query. `projects` pre-filters both sides by the
+        chunk's project metadata (langgraph, langsmith, ...).
+        """
+        _, state = self._ensure_loaded()
+        flt = state.filter(projects)
+        fetch_k = _fetch_k(top_k, SEARCH_OVERFETCH)
+        # copy_context: BM25 süresi de çağıran node'un metrics kırılımına yazılsın
+        lexical_future = _search_pool.submit(contextvars.copy_context().run, self._lexical, state,
+                                             lexical_query or query, fetch_k, flt)
+        dense = self._dense(state, query, fetch_k, flt)
+        lexical = lexical_future.result()
+        ranked = fuse_rankings(dense, lexical)[:top_k]
+        return self._to_results(state, ranked)
+
+    async def ahybrid_search(self, query: str, top_k: int = 20, lexical_query: str = None, projects=None):
+        """
+        hybrid_search offloaded to worker threads (encode + FAISS + BM25 are CPU-bound).
+        With a dense batcher, the encode + FAISS part is batched with concurrent queries.
+        """
+        if self.dense_batcher is None:
+            return await asyncio.to_thread(self.hybrid_search, query, top_k, lexical_query, projects)
+
+        _, state = await asyncio.to_thread(self._ensure_loaded)
+        flt = await asyncio.to_thread(state.filter, projects)
+        fetch_k = _fetch_k(top_k, SEARCH_OVERFETCH)
+        dense, lexical = await asyncio.gather(
+            self.dense_batcher.submit((query, fetch_k, projects)),
+            asyncio.to_thread(self._lexical, state, lexical_query or query, fetch_k, flt),
+        )
+        ranked = fuse_rankings(dense, lexical)[:top_k]
+        return self._to_results(state, ranked)
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> Retriever:
+    """Process-wide Retriever singleton (lazily created)."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = Retriever()
+    return _retriever
 
 
 # ===============================
 # Semantic Search (FAISS only)
 # ===============================
-def semantic_search(query, top_k=20):
+def semantic_search(query, top_k=20, retriever: Retriever = None, projects=None):
     """
     Semantic retrieval (FAISS only).
     """
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DATA_DIR = os.path.join(BASE_DIR, "..", "data")
+    return (retriever or get_retriever()).search(query, top_k=top_k, projects=projects)
+
+
+def hybrid_search(query, top_k=20, lexical_query=None, retriever: Retriever = None, projects=None):
+    """
+    Hybrid retrieval (FAISS + BM25, fused).
+    """
+    return (retriever or get_retriever()).hybrid_search(query, top_k=top_k, lexical_query=lexical_query,
+                                                        projects=projects)
 
-    FAISS_INDEX_PATH = os.path.join(DATA_DIR, "faiss_index.bin")
-    DOCSTORE_PATH = os.path.join(DATA_DIR, "docstore.json")
 
-    model = SentenceTransformer("BAAI/bge-m3")
+# ===============================
+# Rerankers (pluggable: Cohere API or local cross-encoder)
+# ===============================
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "cohere")  # "cohere" | "local"
+COHERE_RERANK_MODEL = "rerank-english-v3.0"
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CROSS_ENCODER_BATCH_SIZE = int(os.getenv("CROSS_ENCODER_BATCH_SIZE", "32"))
+# "onnx" + CROSS_ENCODER_ONNX_FILE (e.g. onnx/model_qint8_avx512.onnx) → int8 ONNX Runtime path
+CROSS_ENCODER_BACKEND = os.getenv("CROSS_ENCODER_BACKEND", "torch")
+CROSS_ENCODER_ONNX_FILE = os.getenv("CROSS_ENCODER_ONNX_FILE")
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "50"))
 
-    with open(DOCSTORE_PATH, "r", encoding="utf-8") as f:
-        docstore = json.load(f)
 
-    global_ids = [int(k) for k in docstore.keys()]
+class Reranker(ABC):
+    """
+    Reranker interface: rerank(query, documents, top_n) → [(doc_index, score), ...] best first.
+    """
 
-    index = faiss.read_index(FAISS_INDEX_PATH)
-    q_emb = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
-    D, I = index.search(q_emb.astype("float32"), k=top_k * 2)
+    @abstractmethod
+    def rerank(self, query: str, documents: list, top_n: int):
+        ...
 
-    faiss_scores = {global_ids[i]: float(D[0][rank]) for rank, i in enumerate(I[0]) if i != -1}
-    if faiss_scores:
-        max_faiss = max(faiss_scores.values())
-        if max_faiss > 0:
-            faiss_scores = {k: v / max_faiss for k, v in faiss_scores.items()}
+    async def arerank(self, query: str, documents: list, top_n: int):
+        """Default async path: run the blocking rerank in a worker thread."""
+        return await asyncio.to_thread(self.rerank, query, documents, top_n)
 
-    ranked = sorted(faiss_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+    def rerank_batch(self, requests):
+        """requests: [(query, documents, top_n), ...] → one result list per request."""
+        return [self.rerank(query, documents, top_n) for query, documents, top_n in requests]
 
-    results = []
-    for gid, score in ranked:
-        doc = docstore[str(gid)]
-        results.append({
-            "global_chunk_id": gid,
-            "score": round(score, 4),
-            "title": doc.get("title", ""),
-            "source": doc.get("source", ""),
-            "content": doc.get("content", ""),
-        })
-    return results
+
+class CohereReranker(Reranker):
+    """Cohere rerank API (one client per process)."""
+
+    def __init__(self, model: str = COHERE_RERANK_MODEL, api_key: str = None):
+        self.model = model
+        self.api_key = api_key or os.environ["COHERE_API_KEY"]
+        import cohere
+
+        self.client = cohere.Client(self.api_key)
+        self._async_client = None
+
+    def rerank(self, query: str, documents: list, top_n: int):
+        response = self.client.rerank(
+            model=self.model,
+            query=query,
+            documents=documents,
+            top_n=top_n,
+        )
+        return [(r.index, r.relevance_score) for r in response.results]
+
+    async def arerank(self, query: str, documents: list, top_n: int):
+        if self._async_client is None:
+            import cohere
+
+            self._async_client = cohere.AsyncClient(self.api_key)
+        response = await self._async_client.rerank(
+            model=self.model,
+            query=query,
+            documents=documents,
+            top_n=top_n,
+        )
+        return [(r.index, r.relevance_score) for r in response.results]
+
+
+class CrossEncoderReranker(Reranker):
+    """Local CPU cross-encoder (sentence-transformers), scored in batches."""
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL, batch_size: int = CROSS_ENCODER_BATCH_SIZE,
+                 backend: str = CROSS_ENCODER_BACKEND, onnx_file: str = CROSS_ENCODER_ONNX_FILE):
+        from sentence_transformers import CrossEncoder
+
+        kwargs = {}
+        if backend == "onnx":
+            kwargs["backend"] = "onnx"
+            if onnx_file:
+                kwargs["model_kwargs"] = {"file_name": onnx_file}
+        self.model = CrossEncoder(model_name, device="cpu", **kwargs)
+        self.batch_size = batch_size
+
+    def rerank(self, query: str, documents: list, top_n: int):
+        if not documents:
+            return []
+        scores = np.asarray(self.model.predict(
+            [(query, doc) for doc in documents],
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+        ), dtype="float32")
+        order = np.argsort(-scores)[:top_n]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def rerank_batch(self, requests):
+        """All (query, doc) pairs of all requests scored in a single predict call."""
+        pairs, spans = [], []
+        for query, documents, _ in requests:
+            spans.append((len(pairs), len(pairs) + len(documents)))
+            pairs.extend((query, doc) for doc in documents)
+        if not pairs:
+            return [[] for _ in requests]
+        scores = np.asarray(self.model.predict(
+            pairs,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+        ), dtype="float32")
+        results = []
+        for (start, end), (_, _, top_n) in zip(spans, requests):
+            part = scores[start:end]
+            order = np.argsort(-part)[:top_n]
+            results.append([(int(i), float(part[i])) for i in order])
+        return results
+
+
+_RERANKER_BACKENDS = {
+    "cohere": CohereReranker,
+    "local": CrossEncoderReranker,
+}
+_rerankers = {}
+_rerankers_lock = threading.Lock()
+
+
+def get_reranker(backend: str = None) -> Reranker:
+    """Process-wide reranker per backend (client/model built once)."""
+    backend = backend or RERANKER_BACKEND
+    if backend not in _rerankers:
+        with _rerankers_lock:
+            if backend not in _rerankers:
+                if backend not in _RERANKER_BACKENDS:
+                    raise ValueError(f"Unknown reranker backend: {backend!r} (expected one of {list(_RERANKER_BACKENDS)})")
+                _rerankers[backend] = _RERANKER_BACKENDS[backend]()
+    return _rerankers[backend]
+
+
+# ===============================
+# Request batching (server mode)
+# ===============================
+_rerank_batcher = None
+
+
+def start_batching(max_batch: int = 32, window_ms: float = 5.0):
+    """
+    Batch concurrent queries' encode + FAISS search (and local cross-encoder
+    rerank) into single calls. Call from the serving event loop.
+    """
+    global _rerank_batcher
+    retriever = get_retriever()
+    if retriever.dense_batcher is None:
+        retriever.dense_batcher = MicroBatcher("dense", retriever.dense_search_batch, max_batch, window_ms)
+        retriever.dense_batcher.start()
+    if _rerank_batcher is None and RERANKER_BACKEND == "local":
+        _rerank_batcher = MicroBatcher("rerank", get_reranker().rerank_batch, max_batch, window_ms)
+        _rerank_batcher.start()
+
+
+async def stop_batching():
+    global _rerank_batcher
+    retriever = get_retriever()
+    if retriever.dense_batcher is not None:
+        await retriever.dense_batcher.stop()
+        retriever.dense_batcher = None
+    if _rerank_batcher is not None:
+        await _rerank_batcher.stop()
+        _rerank_batcher = None
+
+
+def batching_stats() -> dict:
+    stats = {}
+    for batcher in (get_retriever().dense_batcher, _rerank_batcher):
+        if batcher is not None:
+            stats[batcher.name] = batcher.stats()
+    return stats
 
 
 # ===============================
-# Semantic Search + Cohere Rerank (with Query Optimization)
+# Hybrid Search + Rerank (with Query Optimization)
 # ===============================
 @tool
 @traceable(run_type="tool", name="Retriever Tool")
-def hybrid_search_with_rerank(query: str, top_k: int = 10, rerank: bool = True):
+def hybrid_search_with_rerank(query: str, top_k: int = 10, rerank: bool = True, search_query: str = "",
+                              projects: Optional[List[str]] = None):
     """
-    Semantic retrieval (FAISS only) + Cohere Rerank with LLM query optimization.
+    Hybrid retrieval (FAISS + BM25) + rerank (Cohere or local cross-encoder) with LLM query optimization.
+    If search_query is given (e.g. from the combined planner), the LLM rewrite is skipped.
+    projects limits the search to those documentation projects (e.g. ["langgraph"]).
     """
-    # 1. Optimize query first
-    optimized = optimize_query(query)
+    # 1. Optimize query first (unless the planner already did)
+    optimized = search_query.strip() or optimize_query(query)
 
-    # 2. Run semantic search
-    candidates = semantic_search(optimized, top_k=top_k * 2)
+    # 2. Run hybrid search (BM25 also sees the raw query so exact API names match)
+    candidates = hybrid_search(optimized, top_k=_fetch_k(top_k, RERANK_OVERFETCH),
+                               lexical_query=f"{query} {optimized}", projects=projects)
 
-    co = cohere.Client(os.environ["COHERE_API_KEY"])
     if rerank:
+        candidates = candidates[:RERANK_MAX_CANDIDATES]
         documents = [c["content"] for c in candidates]
 
-        response = co.rerank(
-            model="rerank-english-v3.0",
-            query=optimized,
-            documents=documents,
-            top_n=top_k,
-        )
+        record_payload("rerank", "request", sum(len(d) for d in documents))
+        with timed("rerank"):
+            ranked = get_reranker().rerank(optimized, documents, top_n=top_k)
+        return _apply_rerank(candidates, ranked)
+    else:
+        return candidates[:top_k]
 
-        final = []
-        for r in response.results:
-            doc = candidates[r.index]
-            final.append({
-                "global_chunk_id": doc["global_chunk_id"],
-                "score": round(r.relevance_score, 4),
-                "title": doc["title"],
-                "source": doc["source"],
-                "content": doc["content"],
-            })
-        return final
+
+def _apply_rerank(candidates, ranked):
+    final = []
+    for idx, score in ranked:
+        doc = candidates[idx]
+        final.append({
+            "global_chunk_id": doc["global_chunk_id"],
+            "score": round(score, 4),
+            "title": doc["title"],
+            "source": doc["source"],
+            "content": doc["content"],
+            "section": doc.get("section", ""),
+            "chunk_id": doc.get("chunk_id"),
+        })
+    return final
+
+
+@traceable(run_type="tool", name="Retriever Tool (async)")
+async def ahybrid_search_with_rerank(query: str, top_k: int = 10, rerank: bool = True, search_query: str = "",
+                                     projects: Optional[List[str]] = None):
+    """
+    Async hybrid_search_with_rerank: LLM rewrite and Cohere rerank are awaited,
+    encode / FAISS / BM25 / local rerank run in worker threads.
+    """
+    optimized = search_query.strip() or await aoptimize_query(query)
+
+    candidates = await get_retriever().ahybrid_search(
+        optimized, top_k=_fetch_k(top_k, RERANK_OVERFETCH), lexical_query=f"{query} {optimized}",
+        projects=projects
+    )
+
+    if rerank:
+        candidates = candidates[:RERANK_MAX_CANDIDATES]
+        documents = [c["content"] for c in candidates]
+
+        record_payload("rerank", "request", sum(len(d) for d in documents))
+        with timed("rerank"):
+            if _rerank_batcher is not None:
+                ranked = await _rerank_batcher.submit((optimized, documents, top_k))
+            else:
+                ranked = await get_reranker().arerank(optimized, documents, top_n=top_k)
+        return _apply_rerank(candidates, ranked)
     else:
-        return candidates[:top_k]
\ No newline at end of file
+        return candidates[:top_k]
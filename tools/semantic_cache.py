@@ -0,0 +1,225 @@
+import os
+import re
+import atexit
+import asyncio
+import time
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from tools.retriever import get_retriever
+from tools.metrics import record_cache
+
+# ===============================
+# Settings
+# ===============================
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")  # optional disk-backed store
+# Diske yazma store() başına değil, son değişiklikten en fazla bu kadar saniye sonra (0: hemen)
+SEMANTIC_CACHE_PERSIST_DELAY = float(os.getenv("SEMANTIC_CACHE_PERSIST_DELAY", "5"))
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+class _Entry:
+    __slots__ = ("query", "embedding", "payload", "created")
+
+    def __init__(self, query, embedding, payload, created):
+        self.query = query
+        self.embedding = embedding
+        self.payload = payload
+        self.created = created
+
+
+# ===============================
+# Semantic Cache
+# ===============================
+class SemanticCache:
+    """
+    Answer cache keyed on the query embedding: a new query hits if its cosine
+    similarity to a cached query is >= threshold. Entries expire after `ttl`
+    seconds, the least recently used entry is evicted past `max_entries`, and
+    everything is dropped when the retriever's index version changes. With a
+    `path`, changes are written to disk in the background at most
+    `persist_delay` seconds later (and at exit), from a snapshot taken under
+    the lock.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: float = SEMANTIC_CACHE_TTL,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, path: str = SEMANTIC_CACHE_PATH,
+                 retriever=None, persist_delay: float = SEMANTIC_CACHE_PERSIST_DELAY):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.persist_delay = persist_delay
+        self._retriever = retriever
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized query -> _Entry (LRU order)
+        self._matrix = None            # stacked embeddings, rebuilt lazily
+        self._keys = []
+        self._recent = OrderedDict()   # normalized query -> embedding, reused by store()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._persist_lock = threading.Lock()  # tek yazar; _lock'u pickle süresince tutmaz
+        self._dirty = False
+        self._timer = None
+        if path:
+            if os.path.exists(path):
+                self._load()
+            atexit.register(self.flush)
+
+    @property
+    def retriever(self):
+        return self._retriever or get_retriever()
+
+    # --- persistence ---
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            self.version = data["version"]
+            for e in data["entries"]:
+                self._entries[e.query] = e
+        except Exception as e:
+            print(f"⚠️ Semantic cache okunamadı ({self.path}): {e}")
+
+    def _mark_dirty(self):
+        """Called under _lock: schedule a flush unless one is already pending."""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._timer is None and self.persist_delay > 0:
+            self._timer = threading.Timer(self.persist_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now (debounce timer, atexit, tests)."""
+        if not self.path:
+            return
+        with self._persist_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                # _Entry'ler ve payload'ları saklandıktan sonra değişmez: liste kopyası yeterli
+                snapshot = {"version": self.version, "entries": list(self._entries.values())}
+            try:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"⚠️ Semantic cache yazılamadı ({self.path}): {e}")
+
+    # --- internals ---
+    def _check_version(self, version: str):
+        if version != self.version:
+            self._entries.clear()
+            self._matrix = None
+            self.version = version
+
+    def _expire(self, now: float):
+        expired = [k for k, e in self._entries.items() if now - e.created > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _embed(self, key: str):
+        # encode lock dışında: eşzamanlı sorgular birbirini beklemesin
+        with self._lock:
+            emb = self._recent.get(key)
+        if emb is None:
+            emb = self.retriever.encode([key])[0]
+            with self._lock:
+                self._recent[key] = emb
+                if len(self._recent) > 256:
+                    self._recent.popitem(last=False)
+        return emb
+
+    # --- public API ---
+    def lookup(self, query: str):
+        """Returns the cached payload for a similar enough query, or None."""
+        key = normalize_query(query)
+        version = self.retriever.index_version
+        with self._lock:
+            self._check_version(version)
+            self._expire(time.time())
+            need_embedding = key not in self._entries and bool(self._entries)
+        emb = self._embed(key) if need_embedding else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and emb is not None and self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries.keys())
+                    self._matrix = np.stack([self._entries[k].embedding for k in self._keys])
+                sims = self._matrix @ emb
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry = self._entries[self._keys[best]]
+
+            if entry is None:
+                self.misses += 1
+                record_cache("semantic_cache", False)
+                return None
+            self._entries.move_to_end(entry.query)
+            self.hits += 1
+            record_cache("semantic_cache", True)
+            return dict(entry.payload)
+
+    def store(self, query: str, payload: dict):
+        key = normalize_query(query)
+        version = self.retriever.index_version
+        emb = self._embed(key)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = _Entry(key, emb, dict(payload), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+            self._mark_dirty()
+        if self.persist_delay <= 0:
+            self.flush()
+
+    async def alookup(self, query: str):
+        """lookup offloaded to a worker thread (it may encode the query)."""
+        return await asyncio.to_thread(self.lookup, query)
+
+    async def astore(self, query: str, payload: dict):
+        await asyncio.to_thread(self.store, query, payload)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._mark_dirty()
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Process-wide SemanticCache singleton (lazily created)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
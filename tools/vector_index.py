@@ -0,0 +1,135 @@
+import os
+import math
+import numpy as np
+import faiss
+
+# ===============================
+# Settings
+# ===============================
+# flat  : exact inner product, 4 bytes/dim
+# hnsw  : graph over full vectors, fastest search, ~+M*8 bytes/vector
+# ivfpq : inverted lists + product quantization, pq_m bytes/vector
+# sq8   : exact scan over int8-quantized vectors, 1 byte/dim
+INDEX_TYPES = ("flat", "hnsw", "ivfpq", "sq8")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))   # 0 → eğitim örneğine göre otomatik
+PQ_M = int(os.getenv("FAISS_PQ_M", "64"))            # 1024 dim / 64 = 16 dim per sub-quantizer
+TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", "65536"))
+
+# Search-time knobs (retriever side); 0 → leave the index default
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+
+def needs_training(index_type: str) -> bool:
+    return index_type == "ivfpq" or index_type == "sq8"
+
+
+def auto_nlist(n_train: int) -> int:
+    """~4·sqrt(N) lists, but at least 39 training points per centroid (FAISS' own minimum)."""
+    return max(1, min(int(4 * math.sqrt(n_train)), n_train // 39))
+
+
+def new_index(dim: int, index_type: str = FAISS_INDEX_TYPE, train_vectors: np.ndarray = None,
+              hnsw_m: int = HNSW_M, nlist: int = IVF_NLIST, pq_m: int = PQ_M):
+    """
+    Empty IndexIDMap2 around the requested inner-product index. Types that need
+    training (ivfpq, sq8) are trained on `train_vectors` before being returned.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+    if index_type == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "sq8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        if train_vectors is None:
+            raise ValueError("ivfpq needs train_vectors")
+        if dim % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dim {dim}")
+        nlist = nlist or auto_nlist(len(train_vectors))
+        # 8-bit codes → 256 centroids per sub-quantizer; küçük corpus'ta daha az bit
+        nbits = 8 if len(train_vectors) >= 256 * 39 else max(1, int(math.log2(max(2, len(train_vectors) // 39))))
+        quantizer = faiss.IndexFlatIP(dim)
+        base = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, nbits, faiss.METRIC_INNER_PRODUCT)
+
+    if needs_training(index_type):
+        if train_vectors is None:
+            raise ValueError(f"{index_type} needs train_vectors")
+        base.train(np.ascontiguousarray(train_vectors, dtype="float32"))
+
+    return faiss.IndexIDMap2(base)
+
+
+def base_index(index):
+    """The index wrapped by IndexIDMap/IndexIDMap2 (downcast to its concrete type)."""
+    inner = index.index if hasattr(index, "id_map") else index
+    return faiss.downcast_index(inner)
+
+
+def index_type_of(index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+
+def set_search_params(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """Apply nprobe (IVF) / efSearch (HNSW); a no-op for exhaustive indexes."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF) and nprobe:
+        base.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW) and ef_search:
+        base.hnsw.efSearch = ef_search
+
+
+def filter_params(index, ids: np.ndarray):
+    """
+    SearchParameters that restrict the search to `ids` (global_chunk_ids) with an
+    IDSelectorBatch, so FAISS skips everything else instead of us post-filtering.
+    Carries over the index's nprobe / efSearch (the parameter object overrides them).
+    """
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype="int64"))
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def remove_ids(index, ids: np.ndarray):
+    """
+    IndexIDMap2.remove_ids, except for HNSW (which cannot delete): the graph is
+    rebuilt from the remaining vectors (exact, HNSWFlat stores them unquantized).
+    Returns the index to keep using.
+    """
+    if not len(ids):
+        return index
+    if index_type_of(index) != "hnsw":
+        index.remove_ids(np.asarray(ids, dtype="int64"))
+        return index
+
+    all_ids = faiss.vector_to_array(index.id_map)
+    vectors = base_index(index).reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(all_ids, ids)
+    rebuilt = faiss.clone_index(index)
+    rebuilt.reset()
+    if keep.any():
+        rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+    return rebuilt
+
+
+def index_memory_bytes(index) -> int:
+    """Serialized size; close to the resident size of the loaded index."""
+    return int(faiss.serialize_index(index).nbytes)
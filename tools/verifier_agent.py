@@ -1,14 +1,21 @@
 import os
-from typing import TypedDict, Literal
-from langchain_google_genai import ChatGoogleGenerativeAI
+import re
+import json
+import uuid
+import random
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Literal, Callable, Optional
+from tools.llm_cache import llm_memoize
+from tools.llm import structured, astructured, get_structured_model
+from tools.lexical import tokenize
 
 # ===============================
 # LLM Setup
 # ===============================
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-flash",
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+VERIFIER_MODEL = "gemini-1.5-flash"
 
 # ===============================
 # TypedDict Schema
@@ -17,18 +24,10 @@ class VerifierResult(TypedDict):
     verdict: Literal["ok", "hallucination"]
     confidence: float
 
-# LLM augmented with structured output parsing (TypedDict ile)
-llm_verifier = llm.with_structured_output(VerifierResult)
-
 # ===============================
 # Verifier Agent
 # ===============================
-def run_verifier(query: str, answer: str, context: str) -> VerifierResult:
-    """
-    Verifier Agent: checks if answer is grounded in context.
-    Returns VerifierResult TypedDict.
-    """
-    resp: VerifierResult = llm_verifier.invoke(f"""
+VERIFIER_PROMPT = """
     You are a strict verifier.
     Task: Decide if the answer is grounded in the provided documentation context.
 
@@ -38,11 +37,218 @@ def run_verifier(query: str, answer: str, context: str) -> VerifierResult:
     {answer}
 
     Context:
-    {context[:2000]}
+    {context}
 
     Rules:
     - verdict = "ok" if the answer is fully supported by the context.
     - verdict = "hallucination" if the answer contains unsupported or invented info.
     - confidence must be between 0.0 and 1.0.
-    """)
-    return resp
\ No newline at end of file
+    """
+
+@llm_memoize("run_verifier", model=VERIFIER_MODEL, template=VERIFIER_PROMPT)
+def run_verifier(query: str, answer: str, context: str) -> VerifierResult:
+    """
+    Verifier Agent: checks if answer is grounded in context.
+    Returns VerifierResult TypedDict.
+    """
+    resp: VerifierResult = structured(
+        get_structured_model(VERIFIER_MODEL, VerifierResult),
+        VERIFIER_PROMPT.format(query=query, answer=answer, context=context),
+        "llm.verifier",
+    )
+    return resp
+
+@llm_memoize("run_verifier", model=VERIFIER_MODEL, template=VERIFIER_PROMPT)
+async def arun_verifier(query: str, answer: str, context: str) -> VerifierResult:
+    """
+    Async Verifier Agent (shares run_verifier's memo).
+    """
+    resp: VerifierResult = await astructured(
+        get_structured_model(VERIFIER_MODEL, VerifierResult),
+        VERIFIER_PROMPT.format(query=query, answer=answer, context=context),
+        "llm.verifier",
+    )
+    return resp
+
+
+# ===============================
+# Verification Policies
+# ===============================
+# Virgülle birleştirilebilir, sırayla uygulanır:
+#   precheck → lokal lexical kontrol; yeterince destekleniyorsa LLM'e gitmeden "ok",
+#              içerik kelimelerinin neredeyse hiçbiri context'te yoksa "hallucination".
+#              İki sonuçta da LLM hiç çağrılmaz. Red sadece cevap ve context aynı dildeyse
+#              (ör. Türkçe cevap + İngilizce doküman reddedilmez, LLM'e gider)
+#   sampled  → trafiğin sadece VERIFIER_SAMPLE_RATE kadarı LLM ile doğrulanır, kalanı "unverified"
+#   async    → LLM doğrulaması arka planda; cevap hemen "pending" ile döner, sonuç VerdictStore'a yazılır
+#   sync     → bugünkü davranış (LLM doğrulaması bekleniyor)
+# Örn: VERIFIER_POLICY="precheck,sampled,async"
+VERIFIER_POLICY = os.getenv("VERIFIER_POLICY", "sync")
+VERIFIER_SAMPLE_RATE = float(os.getenv("VERIFIER_SAMPLE_RATE", "0.1"))
+PRECHECK_OK_THRESHOLD = float(os.getenv("PRECHECK_OK_THRESHOLD", "0.8"))
+# Skor bunun altındaysa (ve cevapta en az PRECHECK_REJECT_MIN_TOKENS içerik kelimesi varsa) LLM'siz red
+PRECHECK_REJECT_THRESHOLD = float(os.getenv("PRECHECK_REJECT_THRESHOLD", "0.05"))
+PRECHECK_REJECT_MIN_TOKENS = int(os.getenv("PRECHECK_REJECT_MIN_TOKENS", "5"))
+VERDICT_LOG_PATH = os.getenv("VERDICT_LOG_PATH")
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# _language için: Türkçeye özgü harfler + iki dilin sık kelimeleri
+TURKISH_CHAR_RE = re.compile(r"[çğışöüÇĞİŞÖÜ]")
+WORD_RE = re.compile(r"[^\W\d_]+")
+TR_WORDS = {
+    "ve", "bir", "için", "ile", "bu", "şu", "da", "de", "olarak", "gibi", "daha", "ne", "nasıl", "mi", "mı",
+    "veya", "ise", "olan", "her", "çok", "sonra", "önce", "kullanarak", "kullanılır", "eder", "edilir", "yani",
+}
+EN_WORDS = {
+    "the", "and", "for", "with", "that", "this", "you", "your", "are", "is", "to", "of", "in", "a", "an",
+    "it", "be", "by", "or", "can", "use", "when", "which", "how", "what",
+}
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "you", "your", "are", "can", "use", "from",
+    "bir", "ve", "ile", "için", "bu", "da", "de", "olarak", "gibi", "daha",
+}
+
+
+def _grounding_counts(answer: str, context: str):
+    """(content tokens of the answer found in the context, content tokens of the answer)"""
+    context_tokens = set(tokenize(context))
+    total, supported = 0, 0
+    for sentence in SENTENCE_RE.split(answer or ""):
+        tokens = [t for t in tokenize(sentence) if len(t) > 2 and t not in STOPWORDS]
+        total += len(tokens)
+        supported += sum(1 for t in tokens if t in context_tokens)
+    return supported, total
+
+
+def _language(text: str) -> str:
+    """Rough "tr" / "en" guess: Turkish-only letters and common words vs. common English words."""
+    words = [w.lower() for w in WORD_RE.findall(text or "")]
+    tr = len(TURKISH_CHAR_RE.findall(text or "")) + sum(w in TR_WORDS for w in words)
+    en = sum(w in EN_WORDS for w in words)
+    return "tr" if tr > en else "en"
+
+
+def precheck_grounding(answer: str, context: str) -> float:
+    """
+    Cheap local grounding score in [0, 1]: the share of the answer's content
+    tokens (all sentences together) that also occur in the context.
+    """
+    supported, total = _grounding_counts(answer, context)
+    return supported / total if total else 0.0
+
+
+class VerdictStore:
+    """
+    Keeps the latest verdicts by verification id (bounded) and notifies callbacks;
+    optionally appends every verdict to VERDICT_LOG_PATH as JSONL.
+    """
+
+    def __init__(self, max_entries: int = 10000, log_path: str = VERDICT_LOG_PATH):
+        self.max_entries = max_entries
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._verdicts = OrderedDict()
+        self._callbacks = []
+
+    def add_callback(self, callback: Callable[[str, dict], None]):
+        self._callbacks.append(callback)
+
+    def get(self, verification_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._verdicts.get(verification_id)
+
+    def record(self, verification_id: str, query: str, result: dict, on_done: Callable[[dict], None] = None):
+        with self._lock:
+            self._verdicts[verification_id] = result
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"id": verification_id, "query": query, **result}, ensure_ascii=False) + "\n")
+        for callback in self._callbacks:
+            try:
+                callback(verification_id, result)
+            except Exception as e:
+                print(f"⚠️ Verdict callback hatası: {e}")
+        if on_done is not None:
+            on_done(result)
+
+
+verdict_store = VerdictStore()
+_verify_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="verifier")
+_background_tasks = set()
+
+
+def _policy_steps(policy: str):
+    return [p.strip() for p in (policy or VERIFIER_POLICY).split(",") if p.strip()]
+
+
+def _pre_llm(answer: str, context: str, steps) -> Optional[dict]:
+    """precheck / sampled steps; returns a final result or None when the LLM must decide."""
+    if "precheck" in steps:
+        supported, total = _grounding_counts(answer, context)
+        score = supported / total if total else 0.0
+        if score >= PRECHECK_OK_THRESHOLD:
+            return {"verdict": "ok", "confidence": round(score, 3), "verified_by": "precheck"}
+        # Kısa cevaplar ("Evet.") ve context'ten farklı dildeki cevaplar lexical skorla
+        # reddedilmez (çeviri / parafraz düşük örtüşme verir), LLM'e gider
+        if (total >= PRECHECK_REJECT_MIN_TOKENS and score <= PRECHECK_REJECT_THRESHOLD
+                and _language(answer) == _language(context)):
+            return {"verdict": "hallucination", "confidence": round(1 - score, 3), "verified_by": "precheck"}
+    if "sampled" in steps and random.random() >= VERIFIER_SAMPLE_RATE:
+        return {"verdict": "unverified", "confidence": None, "verified_by": "none"}
+    return None
+
+
+def verify(query: str, answer: str, context: str, policy: str = None,
+           on_done: Callable[[dict], None] = None) -> dict:
+    """
+    Verify an answer according to the policy. Returns {"verdict", "confidence", "verified_by"}
+    and, for async verification, "verification_id" (the final verdict goes to verdict_store
+    and `on_done`).
+    """
+    steps = _policy_steps(policy)
+    result = _pre_llm(answer, context, steps)
+    if result is not None:
+        return result
+
+    if "async" in steps:
+        verification_id = uuid.uuid4().hex
+
+        def work():
+            try:
+                res = {**run_verifier(query, answer, context), "verified_by": "llm"}
+            except Exception as e:
+                res = {"verdict": "unverified", "confidence": None, "verified_by": "error", "error": str(e)}
+            verdict_store.record(verification_id, query, res, on_done)
+
+        _verify_pool.submit(work)
+        return {"verdict": "pending", "confidence": None, "verified_by": "llm", "verification_id": verification_id}
+
+    return {**run_verifier(query, answer, context), "verified_by": "llm"}
+
+
+async def averify(query: str, answer: str, context: str, policy: str = None,
+                  on_done: Callable[[dict], None] = None) -> dict:
+    """Async verify: background verification runs as a task on the current event loop."""
+    steps = _policy_steps(policy)
+    result = _pre_llm(answer, context, steps)
+    if result is not None:
+        return result
+
+    if "async" in steps:
+        verification_id = uuid.uuid4().hex
+
+        async def work():
+            try:
+                res = {**await arun_verifier(query, answer, context), "verified_by": "llm"}
+            except Exception as e:
+                res = {"verdict": "unverified", "confidence": None, "verified_by": "error", "error": str(e)}
+            await asyncio.to_thread(verdict_store.record, verification_id, query, res, on_done)
+
+        task = asyncio.get_running_loop().create_task(work())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return {"verdict": "pending", "confidence": None, "verified_by": "llm", "verification_id": verification_id}
+
+    return {**await arun_verifier(query, answer, context), "verified_by": "llm"}